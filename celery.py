@@ -21,4 +21,22 @@ app.conf.beat_schedule = {
         'task': 'cycles.tasks.update_period_records',
         'schedule': timedelta(hours=24),  
     },
+    
+    # Is used to refresh every user's cycle prediction before the first dashboard load of the day
+    'precompute_cycle_predictions': {
+        'task': 'predictions.tasks.precompute_cycle_predictions',
+        'schedule': crontab(hour=0, minute=30),
+    },
+    
+    # Is used to precompute every user's phase for the coming day, read by the dashboard
+    'snapshot_cycle_phases': {
+        'task': 'cycles.tasks.snapshot_cycle_phases',
+        'schedule': crontab(hour=23, minute=0),
+    },
+    
+    # Is used to recompute the population-wide cycle statistics once a week
+    'population_analytics': {
+        'task': 'cycles.tasks.population_analytics',
+        'schedule': crontab(hour=2, minute=0, day_of_week='sunday'),
+    },
 }
@@ -0,0 +1,142 @@
+from itertools import groupby
+from logging import getLogger
+from time import perf_counter
+
+import numpy as np
+
+from cycles.history import CycleHistory, to_epoch_day
+from cycles.models import CycleAnalyticsSummary, PeriodRecord
+from predictions.models import CyclePreditction
+
+logger = getLogger(__name__)
+
+PERCENTILES = (5, 10, 25, 50, 75, 90, 95)
+
+
+class DayHistogram:
+    """
+    Fixed one-day bins from min_value to max_value, values outside are clipped into the edge bins.
+
+    Counts are all that is kept, so any number of values can be added chunk by chunk and the
+    percentiles are still exact for whole days.
+    """
+
+    def __init__(self, min_value, max_value):
+        self.min_value = min_value
+        self.counts = np.zeros(max_value - min_value + 1, dtype=np.int64)
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.int64)
+        if not len(values):
+            return
+
+        bins = np.clip(values - self.min_value, 0, len(self.counts) - 1)
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+
+    def summary(self):
+        total = int(self.counts.sum())
+        if not total:
+            return {'count': 0}
+
+        days = np.arange(len(self.counts)) + self.min_value
+        cumulative = np.cumsum(self.counts)
+        # Smallest day with at least p% of the values at or below it
+        percentile_days = days[np.searchsorted(cumulative, np.ceil(np.array(PERCENTILES) / 100 * total))]
+        mean = float(np.dot(days, self.counts) / total)
+
+        non_empty = np.flatnonzero(self.counts)
+        first, last = non_empty[0], non_empty[-1]
+
+        return {
+            'count': total,
+            'mean': round(mean, 2),
+            'std': round(float(np.sqrt(np.dot((days - mean) ** 2, self.counts) / total)), 2),
+            'percentiles': {f'p{percentile}': int(day) for percentile, day in zip(PERCENTILES, percentile_days)},
+            # Only the populated range of bins, counts[i] is the number of values equal to min_day + i
+            'histogram': {'min_day': int(days[first]), 'counts': self.counts[first:last + 1].tolist()},
+        }
+
+
+class PopulationAnalytics:
+    """Accumulates cycle length, period duration and prediction error histograms over chunks of users"""
+
+    def __init__(self):
+        self.cycle_length = DayHistogram(0, 120)
+        self.period_duration = DayHistogram(0, 30)
+        # Actual minus predicted start of the period the stored prediction was made for
+        self.prediction_error = DayHistogram(-60, 60)
+        self.users_count = 0
+        self.period_records_count = 0
+
+    def add_chunk(self, histories):
+        """
+        Args:
+            histories: {user_id_hash: CycleHistory}
+        """
+        if not histories:
+            return
+
+        self.users_count += len(histories)
+        self.period_records_count += sum(len(history) for history in histories.values())
+        self.cycle_length.add(np.concatenate([history.cycle_lengths for history in histories.values()]))
+        self.period_duration.add(np.concatenate([history.period_durations for history in histories.values()]))
+        self.prediction_error.add(self._prediction_errors(histories))
+
+    def _prediction_errors(self, histories):
+        """Errors of the stored predictions that a later period start can be compared against, one query per chunk"""
+        predictions = CyclePreditction.objects.filter(user_id_hash__in=list(histories.keys())).values_list(
+            'user_id_hash', 'next_period_start', 'update_datetime'
+        )
+
+        predicted_days, actual_days = [], []
+        for user_id_hash, next_period_start, update_datetime in predictions:
+            last_start_day = histories[user_id_hash].last_start_day
+            # Only a period started after the prediction was made is the one it predicted
+            if last_start_day is not None and last_start_day > to_epoch_day(update_datetime):
+                predicted_days.append(to_epoch_day(next_period_start))
+                actual_days.append(last_start_day)
+
+        return np.array(actual_days, dtype=np.int64) - np.array(predicted_days, dtype=np.int64)
+
+
+def compute_population_analytics(chunk_size=500):
+    """
+    Stream every PeriodRecord ordered by user, fold each chunk of `chunk_size` users into the
+    histograms and store the resulting CycleAnalyticsSummary
+
+    Only one chunk of users' histories is held in memory at a time.
+    """
+    started = perf_counter()
+    analytics = PopulationAnalytics()
+
+    period_records = PeriodRecord.objects.order_by('user_id_hash', 'start_datetime').values_list(
+        'user_id_hash', 'start_datetime', 'end_datetime', 'current_status'
+    )
+
+    chunk = {}
+    for user_id_hash, records in groupby(period_records.iterator(chunk_size=chunk_size), key=lambda record: record[0]):
+        chunk[user_id_hash] = CycleHistory.from_records(record[1:] for record in records)
+
+        if len(chunk) >= chunk_size:
+            analytics.add_chunk(chunk)
+            chunk = {}
+
+    analytics.add_chunk(chunk)
+
+    wall_time = perf_counter() - started
+    summary = CycleAnalyticsSummary.objects.create(
+        users_count=analytics.users_count,
+        period_records_count=analytics.period_records_count,
+        cycle_length=analytics.cycle_length.summary(),
+        period_duration=analytics.period_duration.summary(),
+        prediction_error=analytics.prediction_error.summary(),
+        wall_time_seconds=wall_time,
+        records_per_second=analytics.period_records_count / wall_time if wall_time else 0,
+    )
+
+    logger.info(
+        f"Computed population analytics over {summary.users_count} users / {summary.period_records_count} period records "
+        f"in {wall_time:.2f}s ({summary.records_per_second:.1f} records/s)"
+    )
+
+    return summary
@@ -0,0 +1,123 @@
+from logging import getLogger
+from time import time_ns
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = getLogger(__name__)
+
+DASHBOARD = 'dashboard'
+CURRENT_STATUS = 'current-status'
+PAYLOAD_KINDS = (DASHBOARD, CURRENT_STATUS)
+
+# Backends private to one process, an invalidation there never reaches the other workers or Celery
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+_local_backend_reported = False
+
+
+def is_payload_cache_enabled():
+    """Payloads are only cached in a backend shared by every process"""
+    global _local_backend_reported
+
+    backend = settings.CACHES['default']['BACKEND']
+    if backend not in PROCESS_LOCAL_BACKENDS:
+        return True
+
+    if not _local_backend_reported:
+        _local_backend_reported = True
+        logger.warning(f"Payload cache disabled, {backend} is not shared between processes")
+    return False
+
+
+def _version_key(user_id_hash):
+    return f"cycle-data-version:{user_id_hash}"
+
+
+def _payload_key(kind, user_id_hash, data_version):
+    return f"cycle-payload:{kind}:{user_id_hash}:{data_version}"
+
+
+def _counter_key(kind, outcome):
+    return f"cycle-payload-stats:{kind}:{outcome}"
+
+
+def _new_version():
+    # Unique per write, so an evicted version key can never bring back an old payload
+    return time_ns()
+
+
+def get_data_version(user_id_hash):
+    """The user's current data version, payloads cached under an older version are never read again"""
+    data_version = cache.get(_version_key(user_id_hash))
+    if data_version is None:
+        data_version = _new_version()
+        if not cache.add(_version_key(user_id_hash), data_version, timeout=None):
+            data_version = cache.get(_version_key(user_id_hash), data_version)
+    return data_version
+
+
+def invalidate_user_cache(*user_id_hashes):
+    """Write-through invalidation, call after any write that changes what the dashboard shows"""
+    if not is_payload_cache_enabled():
+        return
+
+    data_version = _new_version()
+    cache.set_many({_version_key(user_id_hash): data_version for user_id_hash in user_id_hashes}, timeout=None)
+
+
+def _count(kind, outcome):
+    key = _counter_key(kind, outcome)
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add and incr
+        cache.set(key, 1, timeout=None)
+
+
+def get_cached_payload(kind, user_id_hash, build_payload):
+    """
+    Return the cached payload for the user's current data version, building and caching it on a miss
+
+    Args:
+        build_payload: Callable returning the payload, only called on a miss or with the cache disabled
+    """
+    if not is_payload_cache_enabled():
+        return build_payload()
+
+    key = _payload_key(kind, user_id_hash, get_data_version(user_id_hash))
+
+    payload = cache.get(key)
+    if payload is not None:
+        _count(kind, 'hits')
+        return payload
+
+    _count(kind, 'misses')
+    payload = build_payload()
+    cache.set(key, payload, timeout=settings.CYCLE_PAYLOAD_CACHE_SECONDS)
+
+    return payload
+
+
+def get_cache_stats():
+    """Hit/miss counters per payload kind, None while the payload cache is disabled"""
+    if not is_payload_cache_enabled():
+        return None
+
+    counters = cache.get_many([_counter_key(kind, outcome) for kind in PAYLOAD_KINDS for outcome in ('hits', 'misses')])
+
+    stats = {}
+    for kind in PAYLOAD_KINDS:
+        hits = counters.get(_counter_key(kind, 'hits'), 0)
+        misses = counters.get(_counter_key(kind, 'misses'), 0)
+        stats[kind] = {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / (hits + misses) if hits + misses else None,
+        }
+
+    return stats
@@ -0,0 +1,181 @@
+from datetime import datetime, time
+
+import numpy as np
+from django.utils import timezone
+
+from cycles.features import get_phase_offsets
+from cycles.history import NO_END, CycleHistory, from_epoch_day, to_epoch_day
+from cycles.models import PeriodRecord, PhaseDuration, Phases
+from cycles.utils import PHASE_ORDER
+from predictions.utils import get_cycle_prediction
+
+MAX_CALENDAR_DAYS = 366
+UNKNOWN_PHASE = -1
+# The fertile window is the five days before ovulation, the ovulation day and the day after
+FERTILE_DAYS_BEFORE_OVULATION = 5
+FERTILE_DAYS_AFTER_OVULATION = 1
+
+
+def _run_lengths(values):
+    """(start index, length, value) of every run of equal values in a 1-d array"""
+    if not len(values):
+        return []
+
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(values)) + 1))
+    lengths = np.diff(np.append(starts, len(values)))
+
+    return zip(starts.tolist(), lengths.tolist(), values[starts].tolist())
+
+
+def _spans(days, mask):
+    """Run-length encoded spans of the days where `mask` is set"""
+    return [
+        {'start_date': from_epoch_day(days[start]), 'days': length}
+        for start, length, value in _run_lengths(mask.astype(np.int8))
+        if value
+    ]
+
+
+def calendar_history(records):
+    """
+    CycleHistory of (start_datetime, end_datetime, current_status) records for the calendar, which
+    paints every recorded end. Records auto-closed before COMPLETED was set on close are still
+    ONGOING with an end, they would otherwise count as ongoing until today.
+    """
+    completed = PeriodRecord.CurrentStatus.COMPLETED
+    return CycleHistory.from_records(
+        (start_datetime, end_datetime, completed if end_datetime is not None else current_status)
+        for start_datetime, end_datetime, current_status in records
+    )
+
+
+def get_calendar_periods(user_id_hash, start_day, end_day):
+    """
+    Recorded periods that can affect the days from start_day to end_day: the last one starting
+    before the range and every one starting inside it
+    """
+    range_start = timezone.make_aware(datetime.combine(from_epoch_day(start_day), time.min))
+    range_end = timezone.make_aware(datetime.combine(from_epoch_day(end_day + 1), time.min))
+
+    records = PeriodRecord.objects.filter(user_id_hash=user_id_hash)
+    previous = records.filter(start_datetime__lt=range_start).order_by('-start_datetime').values_list(
+        'start_datetime', 'end_datetime', 'current_status'
+    )[:1]
+    in_range = records.filter(start_datetime__gte=range_start, start_datetime__lt=range_end).order_by('start_datetime').values_list(
+        'start_datetime', 'end_datetime', 'current_status'
+    )
+
+    return calendar_history([*previous, *in_range])
+
+
+def predict_period_starts(last_start_day, next_period_start_day, cycle_length, today, end_day):
+    """
+    Predicted period start days up to end_day, the first one from the stored prediction and
+    every cycle_length days after it. An overdue prediction is moved to today.
+    """
+    if not cycle_length:
+        return np.array([], dtype=np.int32)
+
+    # A prediction less than half a cycle after the latest start was made for the cycle before it
+    if next_period_start_day is None or next_period_start_day < last_start_day + cycle_length // 2:
+        next_period_start_day = last_start_day + cycle_length
+    first_day = max(next_period_start_day, today)
+
+    return np.arange(first_day, end_day + 1, cycle_length, dtype=np.int32)
+
+
+def build_cycle_calendar(start_day, end_day, history, predicted_starts, period_duration, phase_offsets, today):
+    """
+    Phase, predicted period days and fertile window of every day from start_day to end_day
+
+    Days are epoch days, periods cover their start through their end day. Each day belongs to the
+    cycle of the latest (recorded or predicted) period starting on or before it, phases follow
+    the user's phase offsets like get_current_phase.
+
+    Returns:
+        (days, phases, predicted_period, fertile) arrays
+    """
+    days = np.arange(start_day, end_day + 1, dtype=np.int32)
+
+    # An ongoing period lasts at least until today and at least the expected duration
+    period_ends = np.where(history.ends == NO_END, np.maximum(today, history.starts + period_duration), history.ends)
+
+    starts = np.concatenate([history.starts, predicted_starts]).astype(np.int32)
+    ends = np.concatenate([period_ends, predicted_starts + period_duration]).astype(np.int32)
+    predicted = np.concatenate([np.zeros(len(history), dtype=bool), np.ones(len(predicted_starts), dtype=bool)])
+    order = np.argsort(starts, kind='stable')
+    starts, ends, predicted = starts[order], ends[order], predicted[order]
+
+    cycle_index = np.searchsorted(starts, days, side='right') - 1
+    known = cycle_index >= 0
+    cycle_index = np.maximum(cycle_index, 0)
+
+    if len(starts):
+        cycle_days = days - starts[cycle_index]
+        in_period = known & (days <= ends[cycle_index])
+        in_predicted_cycle = known & predicted[cycle_index]
+    else:
+        cycle_days = np.zeros(len(days), dtype=np.int32)
+        in_period = in_predicted_cycle = np.zeros(len(days), dtype=bool)
+
+    phase_values = np.array([phase.value for phase in PHASE_ORDER], dtype=np.int8)
+    phase_index = np.maximum(np.searchsorted(phase_offsets, cycle_days, side='right') - 1, 0)
+    # Outside a period the menstrual offset range counts as follicular, like get_phase_for_cycle_day
+    phase_index = np.where(in_period, 0, np.maximum(phase_index, 1))
+    phases = np.where(known, phase_values[phase_index], UNKNOWN_PHASE).astype(np.int8)
+
+    ovulation_start, ovulation_end = phase_offsets[2], phase_offsets[3]
+
+    fertile = known & ~in_period & (cycle_days >= ovulation_start - FERTILE_DAYS_BEFORE_OVULATION) & (cycle_days < ovulation_end + FERTILE_DAYS_AFTER_OVULATION)
+
+    return days, phases, in_period & in_predicted_cycle, fertile
+
+
+def encode_cycle_calendar(days, phases, predicted_period, fertile):
+    """Compact payload: run-length encoded phase spans plus the predicted period and fertile window spans"""
+    return {
+        'phases': [
+            {
+                'phase': phase if phase != UNKNOWN_PHASE else None,
+                'phase_name': Phases.phase_to_string(Phases(phase)) if phase != UNKNOWN_PHASE else "Unknown",
+                'start_date': from_epoch_day(days[start]),
+                'days': length,
+            }
+            for start, length, phase in _run_lengths(phases)
+        ],
+        'predicted_periods': _spans(days, predicted_period),
+        'fertile_windows': _spans(days, fertile),
+    }
+
+
+def get_cycle_calendar(user_id_hash, start_date, end_date, context):
+    """
+    Calendar payload for the user from start_date to end_date (inclusive), predicted periods come
+    from the stored prediction and repeat every predicted cycle length after it
+    """
+    start_day, end_day, today = to_epoch_day(start_date), to_epoch_day(end_date), to_epoch_day(timezone.now())
+
+    history = get_calendar_periods(user_id_hash, start_day, end_day)
+
+    prediction, _, _ = get_cycle_prediction(user_id_hash, context=context)
+    features = context.features
+    if prediction and features.last_start_datetime is not None:
+        predicted_starts = predict_period_starts(
+            last_start_day=to_epoch_day(features.last_start_datetime),
+            next_period_start_day=to_epoch_day(prediction['next_period_start']),
+            cycle_length=prediction['cycle_length'],
+            today=today,
+            end_day=end_day,
+        )
+        period_duration = prediction['period_duration']
+    else:
+        predicted_starts = np.array([], dtype=np.int32)
+        period_duration = PhaseDuration.MENSTRUAL.value
+
+    # Predictions only cover the future, the past is what was recorded. One starting before
+    # start_day can still overlap the range, build_cycle_calendar clips to the range itself
+    predicted_starts = predicted_starts[predicted_starts >= today]
+
+    return encode_cycle_calendar(*build_cycle_calendar(
+        start_day, end_day, history, predicted_starts, period_duration, get_phase_offsets(features), today
+    ))
@@ -0,0 +1,170 @@
+from datetime import datetime
+from logging import getLogger
+
+from django.db import connection
+from django.utils import timezone
+
+from cycles.features import get_cycle_features
+from cycles.stats import get_cycle_statistics
+from cycles.models import CurrentPeriod, CycleFeatures, PeriodRecord, PhaseSnapshot
+from predictions.models import CyclePreditction
+
+logger = getLogger(__name__)
+
+
+def _from_document(model, document):
+    """Build an (unsaved, read-only) model instance from a raw MongoDB document"""
+    values = {}
+    for field in model._meta.concrete_fields:
+        if field.column not in document:
+            continue
+
+        value = document[field.column]
+        # pymongo hands back naive UTC datetimes
+        if isinstance(value, datetime) and timezone.is_naive(value):
+            value = timezone.make_aware(value, timezone.utc)
+        values[field.attname] = field.to_python(value)
+
+    return model(**values)
+
+
+class UserCycleContext:
+    """
+    Everything the dashboard needs about one user, loaded once per request.
+
+    `load` fetches the user's CurrentPeriod, their most recent PeriodRecords, CycleFeatures,
+    PhaseSnapshot and CyclePreditction with a single aggregation ($lookup from current_period),
+    and the helpers in cycles.utils and predictions.utils read from it instead of querying again.
+    """
+
+    RECENT_PERIOD_RECORDS = 4
+
+    def __init__(self, user_id_hash, current_period=None, recent_period_records=None, features=None, cycle_prediction=None, phase_snapshot=None, cycle_statistics=None):
+        self.user_id_hash = user_id_hash
+        self.current_period = current_period
+        # Most recent first
+        self.recent_period_records = recent_period_records or []
+        self._features = features
+        self.cycle_prediction = cycle_prediction
+        self.phase_snapshot = phase_snapshot
+        self._cycle_statistics = cycle_statistics
+
+    @classmethod
+    def lookup_stages(cls, include_dashboard_data=True):
+        """$lookup stages joining a current_period document with the rest of the user's cycle data"""
+        stages = [
+            {'$lookup': {
+                'from': PeriodRecord._meta.db_table,
+                'let': {'user_id_hash': '$user_id_hash'},
+                'pipeline': [
+                    {'$match': {'$expr': {'$eq': ['$user_id_hash', '$$user_id_hash']}}},
+                    {'$sort': {'start_datetime': -1}},
+                    {'$limit': cls.RECENT_PERIOD_RECORDS},
+                ],
+                'as': 'recent_period_records',
+            }},
+            {'$lookup': {
+                'from': CycleFeatures._meta.db_table,
+                'localField': 'user_id_hash',
+                'foreignField': 'user_id_hash',
+                'as': 'cycle_features',
+            }},
+        ]
+        if include_dashboard_data:
+            stages += [
+                {'$lookup': {
+                    'from': PhaseSnapshot._meta.db_table,
+                    'localField': 'user_id_hash',
+                    'foreignField': 'user_id_hash',
+                    'as': 'phase_snapshot',
+                }},
+                {'$lookup': {
+                    'from': CyclePreditction._meta.db_table,
+                    'localField': 'user_id_hash',
+                    'foreignField': 'user_id_hash',
+                    'as': 'cycle_prediction',
+                }},
+            ]
+        return stages
+
+    @classmethod
+    def from_document(cls, document):
+        """Build the context from one current_period document joined by lookup_stages"""
+        def first(model, key):
+            return _from_document(model, document[key][0]) if document.get(key) else None
+
+        return cls(
+            document['user_id_hash'],
+            current_period=_from_document(CurrentPeriod, document),
+            recent_period_records=[_from_document(PeriodRecord, record) for record in document['recent_period_records']],
+            features=first(CycleFeatures, 'cycle_features'),
+            cycle_prediction=first(CyclePreditction, 'cycle_prediction'),
+            phase_snapshot=first(PhaseSnapshot, 'phase_snapshot'),
+        )
+
+    @classmethod
+    def pipeline(cls, user_id_hash):
+        """The current_period aggregation load runs for one user"""
+        return [
+            {'$match': {'user_id_hash': user_id_hash}},
+            {'$limit': 1},
+            *cls.lookup_stages(),
+        ]
+
+    @classmethod
+    def load(cls, user_id_hash):
+        connection.ensure_connection()
+        documents = list(connection.connection[CurrentPeriod._meta.db_table].aggregate(cls.pipeline(user_id_hash)))
+
+        # No CurrentPeriod means the user has not been onboarded, so there is nothing else to find either
+        if not documents:
+            return cls(user_id_hash)
+
+        return cls.from_document(documents[0])
+
+    @property
+    def features(self):
+        # Users whose features were never built get them rebuilt (and stored) on first access
+        if self._features is None:
+            self._features = get_cycle_features(self.user_id_hash)
+        return self._features
+
+    @property
+    def cycle_statistics(self):
+        # Computed on first access, batch jobs set them for a whole chunk of users up front
+        if self._cycle_statistics is None:
+            self._cycle_statistics = get_cycle_statistics(self.user_id_hash)
+        return self._cycle_statistics
+
+    @cycle_statistics.setter
+    def cycle_statistics(self, cycle_statistics):
+        self._cycle_statistics = cycle_statistics
+
+    @property
+    def history_version(self):
+        return (self.current_period.history_version or 0) if self.current_period else 0
+
+    @property
+    def current_phase_snapshot(self):
+        """The stored PhaseSnapshot, unless a period was started or ended since it was taken"""
+        snapshot = self.phase_snapshot
+        if not snapshot or not self.current_period:
+            return None
+
+        if (snapshot.current_period_record_id, snapshot.last_period_record_id) != (self.current_period.current_period_record_id, self.current_period.last_period_record_id):
+            return None
+
+        return snapshot
+
+    @property
+    def last_period_record(self):
+        """The PeriodRecord CurrentPeriod.last_period_record_id points to"""
+        if not self.current_period or not self.current_period.last_period_record_id:
+            return None
+
+        for period_record in self.recent_period_records:
+            if str(period_record.period_record_id) == str(self.current_period.last_period_record_id):
+                return period_record
+
+        # Not among the most recent ones, e.g. a backdated record was added after it
+        return PeriodRecord.objects.filter(period_record_id=self.current_period.last_period_record_id).first()
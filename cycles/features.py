@@ -0,0 +1,250 @@
+from cycles.history import days_between
+from cycles.models import CycleFeatures, PeriodRecord, PhaseDuration
+
+# Used until the user has recorded a full cycle / a completed period
+DEFAULT_CYCLE_LENGTH = PhaseDuration.MENSTRUAL.value + PhaseDuration.FOLLICULAR.value + PhaseDuration.OVULATION.value + PhaseDuration.LUTEAL.value
+
+
+def _push_recent(values, value):
+    """Append to a rolling window, keeping only the last CycleFeatures.RECENT_WINDOW values"""
+    values.append(value)
+    del values[:-CycleFeatures.RECENT_WINDOW]
+
+
+def _update_cycle_regularity(features, cycle_length):
+    """Welford's running mean/M2 and the EWMA, call after cycle_length_count was incremented"""
+    delta = cycle_length - features.cycle_length_mean
+    features.cycle_length_mean += delta / features.cycle_length_count
+    features.cycle_length_m2 += delta * (cycle_length - features.cycle_length_mean)
+
+    if features.cycle_length_ewma is None:
+        features.cycle_length_ewma = float(cycle_length)
+    else:
+        features.cycle_length_ewma += CycleFeatures.EWMA_ALPHA * (cycle_length - features.cycle_length_ewma)
+
+
+def compute_phase_offsets(features):
+    """
+    Cycle day on which each phase starts, in Phases order (menstrual, follicular, ovulation, luteal)
+
+    The follicular phase starts when the average period ends and ovulation is placed
+    PhaseDuration.LUTEAL days before the average cycle ends, since the luteal phase is the
+    one that stays constant as cycles get longer or shorter.
+    """
+    if features.cycle_length_count:
+        cycle_length = int(round(features.cycle_length_sum / features.cycle_length_count))
+    else:
+        cycle_length = DEFAULT_CYCLE_LENGTH
+
+    if features.period_duration_count:
+        period_length = max(int(round(features.period_duration_sum / features.period_duration_count)), 1)
+    else:
+        period_length = PhaseDuration.MENSTRUAL.value
+
+    ovulation_start = max(cycle_length - PhaseDuration.LUTEAL.value, period_length + 1)
+
+    return [0, period_length, ovulation_start, ovulation_start + PhaseDuration.OVULATION.value]
+
+
+def get_phase_offsets(features):
+    """The stored phase offsets, computed on the fly for features stored before they existed"""
+    return features.phase_offsets or compute_phase_offsets(features)
+
+
+def apply_period_start(features, start_datetime):
+    """O(1) update of the features for a newly started period (unsaved)"""
+    if features.last_start_datetime is not None:
+        cycle_length = days_between(start_datetime, features.last_start_datetime)
+        _push_recent(features.recent_cycle_lengths, cycle_length)
+        features.cycle_length_sum += cycle_length
+        features.cycle_length_count += 1
+        features.cycle_length_prefix_sums.append(features.cycle_length_prefix_sums[-1] + cycle_length)
+        _update_cycle_regularity(features, cycle_length)
+        features.phase_offsets = compute_phase_offsets(features)
+
+    features.last_start_datetime = start_datetime
+
+
+def apply_period_end(features, start_datetime, end_datetime):
+    """O(1) update of the features for a newly completed period (unsaved)"""
+    if features.last_completed_start_datetime is not None:
+        _push_recent(features.recent_completed_cycle_lengths, days_between(start_datetime, features.last_completed_start_datetime))
+
+    period_duration = days_between(end_datetime, start_datetime)
+    _push_recent(features.recent_period_durations, period_duration)
+    features.period_duration_sum += period_duration
+    features.period_duration_count += 1
+    features.period_duration_prefix_sums.append(features.period_duration_prefix_sums[-1] + period_duration)
+    features.phase_offsets = compute_phase_offsets(features)
+
+    features.last_completed_start_datetime = start_datetime
+
+
+def build_cycle_features(user_id_hash, period_records):
+    """
+    Build the features from scratch (unsaved)
+
+    Args:
+        period_records: Iterable of (start_datetime, end_datetime, current_status) sorted by start_datetime
+    """
+    features = CycleFeatures(
+        user_id_hash=user_id_hash,
+        recent_cycle_lengths=[],
+        recent_completed_cycle_lengths=[],
+        recent_period_durations=[],
+        cycle_length_prefix_sums=[0],
+        period_duration_prefix_sums=[0],
+        features_version=CycleFeatures.VERSION,
+    )
+    features.phase_offsets = compute_phase_offsets(features)
+
+    for start_datetime, end_datetime, current_status in period_records:
+        apply_period_start(features, start_datetime)
+        if current_status == PeriodRecord.CurrentStatus.COMPLETED and end_datetime is not None:
+            apply_period_end(features, start_datetime, end_datetime)
+
+    return features
+
+
+def rebuild_cycle_features(user_id_hash):
+    """Recompute and store the user's features from their full period history"""
+    period_records = PeriodRecord.objects.filter(user_id_hash=user_id_hash).order_by('start_datetime').values_list(
+        'start_datetime', 'end_datetime', 'current_status'
+    )
+
+    features = build_cycle_features(user_id_hash, period_records)
+    features.save()
+
+    return features
+
+
+def has_prefix_sums(features):
+    """False for features stored before the prefix sums were added, those need a rebuild"""
+    return (
+        len(features.cycle_length_prefix_sums) == features.cycle_length_count + 1
+        and len(features.period_duration_prefix_sums) == features.period_duration_count + 1
+    )
+
+
+def is_current(features):
+    """False for features stored by an older CycleFeatures.VERSION or with inconsistent prefix sums, those need a rebuild"""
+    return features.features_version == CycleFeatures.VERSION and has_prefix_sums(features)
+
+
+def get_cycle_features(user_id_hash):
+    """Point lookup of the user's features, rebuilt from the history if they were never stored"""
+    features = CycleFeatures.objects.filter(user_id_hash=user_id_hash).first()
+    if not features or not is_current(features):
+        features = rebuild_cycle_features(user_id_hash)
+    return features
+
+
+def record_period_start(user_id_hash, start_datetime):
+    """Call after a PeriodRecord was started"""
+    features = CycleFeatures.objects.filter(user_id_hash=user_id_hash).first()
+
+    # A missing or outdated document or a backdated start cannot be applied incrementally, the rebuild already includes the new record
+    if not features or not is_current(features) or (features.last_start_datetime and start_datetime < features.last_start_datetime):
+        return rebuild_cycle_features(user_id_hash)
+
+    apply_period_start(features, start_datetime)
+    features.save()
+
+    return features
+
+
+def record_period_end(user_id_hash, start_datetime, end_datetime):
+    """Call after a PeriodRecord was completed"""
+    features = CycleFeatures.objects.filter(user_id_hash=user_id_hash).first()
+
+    if not features or not is_current(features):
+        return rebuild_cycle_features(user_id_hash)
+
+    apply_period_end(features, start_datetime, end_datetime)
+    features.save()
+
+    return features
+
+
+def get_cycle_regularity(features):
+    """
+    Cycle length variance (sample), standard deviation, EWMA and the irregularity flag from the
+    running accumulators, without touching the period history
+    """
+    count = features.cycle_length_count
+    variance = features.cycle_length_m2 / (count - 1) if count > 1 else None
+    std = variance ** 0.5 if variance is not None else None
+
+    return {
+        'cycle_count': count,
+        'cycle_length_mean': round(features.cycle_length_mean, 2) if count else None,
+        'cycle_length_variance': round(variance, 2) if variance is not None else None,
+        'cycle_length_std': round(std, 2) if std is not None else None,
+        'cycle_length_ewma': round(features.cycle_length_ewma, 2) if features.cycle_length_ewma is not None else None,
+        'is_irregular': count >= CycleFeatures.IRREGULAR_MIN_CYCLES and std > CycleFeatures.IRREGULAR_STD_DAYS,
+    }
+
+
+def get_window_mean(prefix_sums, window):
+    """
+    Mean of the last `window` values in O(1), with the trend delta against the `window` values before them
+
+    Returns:
+        (mean, count, trend_delta), mean is None without values and trend_delta None without two full windows
+    """
+    total = len(prefix_sums) - 1
+    count = min(window, total)
+    if count < 1:
+        return None, 0, None
+
+    mean = (prefix_sums[total] - prefix_sums[total - count]) / count
+
+    trend_delta = None
+    if total >= 2 * window:
+        previous_mean = (prefix_sums[total - window] - prefix_sums[total - 2 * window]) / window
+        trend_delta = mean - previous_mean
+
+    return mean, count, trend_delta
+
+
+def get_windowed_stats(features, windows):
+    """Mean and trend of cycle length and period duration over each trailing window of cycles"""
+    def summary(prefix_sums, window):
+        mean, count, trend_delta = get_window_mean(prefix_sums, window)
+        return {
+            'mean': round(mean, 2) if mean is not None else None,
+            'count': count,
+            'trend_delta': round(trend_delta, 2) if trend_delta is not None else None,
+        }
+
+    return [
+        {
+            'window': window,
+            'cycle_length': summary(features.cycle_length_prefix_sums, window),
+            'period_duration': summary(features.period_duration_prefix_sums, window),
+        }
+        for window in windows
+    ]
+
+
+def get_model_input(features):
+    """
+    The model's 3x2 input built from the stored features, same result as CycleHistory.model_input
+    and PeriodPredictionService.prepare_input_from_history on the completed periods
+
+    Only completed periods count, so a period that is (or was left) ONGOING anywhere in the
+    history is skipped rather than splitting the cycle it falls into.
+
+    Returns:
+        (last_three_cycles, last_period_date), or None if there are fewer than 4 completed periods
+    """
+    if features.period_duration_count < 4:
+        return None
+
+    # Cycle i runs from completed period i to i + 1, paired with the duration of period i
+    last_three_cycles = [
+        [cycle_length, period_duration]
+        for cycle_length, period_duration in zip(features.recent_completed_cycle_lengths[-3:], features.recent_period_durations[-4:-1])
+    ]
+
+    return last_three_cycles, features.last_completed_start_datetime
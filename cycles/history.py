@@ -0,0 +1,146 @@
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+from django.utils import timezone
+
+from cycles.models import PeriodRecord
+
+EPOCH = date(1970, 1, 1)
+# Marks a period without an end in CycleHistory.ends
+NO_END = -1
+
+
+def to_epoch_day(value):
+    """Days since 1970-01-01 of a date, or of an aware datetime in the local timezone"""
+    if isinstance(value, datetime):
+        value = timezone.localdate(value)
+    return (value - EPOCH).days
+
+
+def from_epoch_day(epoch_day):
+    return EPOCH + timedelta(days=int(epoch_day))
+
+
+def epoch_day_to_datetime(epoch_day):
+    """Local midnight of an epoch day as an aware datetime"""
+    return timezone.make_aware(datetime.combine(from_epoch_day(epoch_day), time.min))
+
+
+def days_between(later, earlier):
+    """Calendar days between two datetimes in the local timezone, the unit every cycle length and duration is counted in"""
+    return to_epoch_day(later) - to_epoch_day(earlier)
+
+
+class CycleHistory:
+    """
+    A user's period history as two int32 epoch-day arrays, sorted by start.
+
+    Built once from a values_list projection, so cycle lengths, period durations and model
+    inputs are array differences instead of datetime arithmetic per record.
+    """
+
+    __slots__ = ('starts', 'ends', 'start_datetimes')
+
+    def __init__(self, starts, ends, start_datetimes=None):
+        self.starts = np.asarray(starts, dtype=np.int32)
+        # NO_END for ongoing periods
+        self.ends = np.asarray(ends, dtype=np.int32)
+        # The recorded start datetimes when built from records, days alone lose the time of day
+        self.start_datetimes = np.asarray(start_datetimes, dtype=object) if start_datetimes is not None else None
+
+    @classmethod
+    def from_records(cls, records):
+        """
+        Args:
+            records: Iterable of (start_datetime, end_datetime, current_status) sorted by start_datetime
+        """
+        starts, ends, start_datetimes = [], [], []
+        for start_datetime, end_datetime, current_status in records:
+            starts.append(to_epoch_day(start_datetime))
+            completed = current_status == PeriodRecord.CurrentStatus.COMPLETED and end_datetime is not None
+            ends.append(to_epoch_day(end_datetime) if completed else NO_END)
+            start_datetimes.append(start_datetime)
+
+        return cls(starts, ends, start_datetimes)
+
+    @classmethod
+    def for_user(cls, user_id_hash, queryset=None):
+        """The user's history from one projection query, optionally narrowed by `queryset`"""
+        queryset = PeriodRecord.objects.all() if queryset is None else queryset
+        return cls.from_records(
+            queryset.filter(user_id_hash=user_id_hash).order_by('start_datetime').values_list(
+                'start_datetime', 'end_datetime', 'current_status'
+            )
+        )
+
+    @classmethod
+    def from_period_history(cls, period_history):
+        """From a list of {'start', 'end'} dicts of datetimes or ISO strings, in any order"""
+        def parse(value):
+            return datetime.fromisoformat(value) if isinstance(value, str) else value
+
+        start_datetimes = np.array([parse(period['start']) for period in period_history], dtype=object)
+        starts = np.array([to_epoch_day(start_datetime) for start_datetime in start_datetimes], dtype=np.int32)
+        ends = np.array([to_epoch_day(parse(period['end'])) for period in period_history], dtype=np.int32)
+        order = np.argsort(starts, kind='stable')
+
+        return cls(starts[order], ends[order], start_datetimes[order])
+
+    def __len__(self):
+        return len(self.starts)
+
+    @property
+    def completed(self):
+        """Mask of the periods that have an end"""
+        return self.ends != NO_END
+
+    @property
+    def cycle_lengths(self):
+        """Days between consecutive period starts"""
+        return np.diff(self.starts)
+
+    @property
+    def period_durations(self):
+        """Days from start to end of every completed period"""
+        completed = self.completed
+        return self.ends[completed] - self.starts[completed]
+
+    @property
+    def last_start_day(self):
+        return int(self.starts[-1]) if len(self) else None
+
+    @property
+    def last_start_datetime(self):
+        """The recorded datetime of the most recent start, local midnight of its day if only days are known"""
+        if not len(self):
+            return None
+        if self.start_datetimes is None:
+            return epoch_day_to_datetime(self.starts[-1])
+        return self.start_datetimes[-1]
+
+    def _select(self, index):
+        start_datetimes = self.start_datetimes[index] if self.start_datetimes is not None else None
+        return CycleHistory(self.starts[index], self.ends[index], start_datetimes)
+
+    def only_completed(self):
+        return self._select(self.completed)
+
+    def last(self, count):
+        """The most recent `count` periods"""
+        return self._select(slice(-count, None))
+
+    def model_input(self, cycles=3):
+        """
+        The model's (cycles, 2) [cycle_length, period_duration] input from the last cycles + 1
+        completed periods, oldest first, same as get_model_input on the stored features
+
+        Returns:
+            (model_input, last_start_day), or None if there are not enough completed periods
+        """
+        recent = self.only_completed().last(cycles + 1)
+        if len(recent) < cycles + 1:
+            return None
+
+        model_input = np.stack([np.diff(recent.starts), (recent.ends - recent.starts)[:-1]], axis=-1).astype(np.float64)
+
+        return model_input, recent.last_start_day
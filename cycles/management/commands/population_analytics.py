@@ -0,0 +1,24 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from cycles.analytics import compute_population_analytics
+
+
+class Command(BaseCommand):
+    help = 'Compute cycle length, period duration and prediction error distributions over all users and store the summary'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='Number of users held in memory at a time')
+
+    def handle(self, *args, **options):
+        summary = compute_population_analytics(chunk_size=options['chunk_size'])
+
+        for field in ('cycle_length', 'period_duration', 'prediction_error'):
+            statistics = {key: value for key, value in getattr(summary, field).items() if key != 'histogram'}
+            self.stdout.write(f'{field}: {json.dumps(statistics)}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Analyzed {summary.users_count} users / {summary.period_records_count} period records in '
+            f'{summary.wall_time_seconds:.2f}s ({summary.records_per_second:.1f} records/s), summary {summary.summary_id}'
+        ))
@@ -0,0 +1,51 @@
+from itertools import groupby
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from cycles.features import build_cycle_features, rebuild_cycle_features
+from cycles.models import CycleFeatures, PeriodRecord
+
+
+class Command(BaseCommand):
+    help = 'Rebuild (or backfill) the per-user cycle features, including the regularity accumulators, from the full period history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', dest='user_id_hash', help='Only rebuild this user_id_hash')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Number of users written per bulk insert')
+
+    def handle(self, *args, **options):
+        if options['user_id_hash']:
+            rebuild_cycle_features(options['user_id_hash'])
+            self.stdout.write(self.style.SUCCESS(f'Rebuilt cycle features for {options["user_id_hash"]}'))
+            return
+
+        started = perf_counter()
+        chunk_size = options['chunk_size']
+
+        # Streamed ordered by user so only one user's history is held at a time
+        period_records = PeriodRecord.objects.order_by('user_id_hash', 'start_datetime').values_list(
+            'user_id_hash', 'start_datetime', 'end_datetime', 'current_status'
+        )
+
+        users_processed = 0
+        chunk = []
+        for user_id_hash, records in groupby(period_records.iterator(chunk_size=chunk_size), key=lambda record: record[0]):
+            chunk.append(build_cycle_features(user_id_hash, (record[1:] for record in records)))
+
+            if len(chunk) >= chunk_size:
+                self._write_chunk(chunk)
+                users_processed += len(chunk)
+                chunk = []
+
+        if chunk:
+            self._write_chunk(chunk)
+            users_processed += len(chunk)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt cycle features for {users_processed} users in {perf_counter() - started:.2f}s'
+        ))
+
+    def _write_chunk(self, chunk):
+        CycleFeatures.objects.filter(user_id_hash__in=[features.user_id_hash for features in chunk]).delete()
+        CycleFeatures.objects.bulk_create(chunk)
@@ -0,0 +1,258 @@
+from datetime import timedelta
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from pymongo import IndexModel
+from pymongo.errors import OperationFailure
+
+from cycles.context import UserCycleContext
+from cycles.models import CurrentPeriod, CycleFeatures, PeriodRecord, PhaseSnapshot, SymptomsRecord
+from cycles.stats import cycle_statistics_pipeline
+from predictions.models import CyclePreditction
+from users.models import User, UserDetails
+
+# Indexes created from MONGO_INDEXES are prefixed, anything else (e.g. djongo's own) is left alone
+INDEX_PREFIX = 'spec_'
+# Duplicate keys printed per unique index that cannot be created
+DUPLICATES_SHOWN = 10
+
+
+def query_plans(user_id_hash, email, record_id):
+    """
+    (description, model, find command) for the queries the views and tasks issue, written out
+    the way djongo sends them
+    """
+    now = timezone.now()
+    ongoing, completed = PeriodRecord.CurrentStatus.ONGOING.value, PeriodRecord.CurrentStatus.COMPLETED.value
+
+    return [
+        ('PeriodRecordView.get listing', PeriodRecord, {
+            'filter': {'user_id_hash': user_id_hash, 'start_datetime': {'$lte': now}, 'end_datetime': {'$gte': now - timedelta(days=365)}},
+            'sort': {'start_datetime': -1, 'period_record_id': -1}, 'limit': 11,
+        }),
+        ('PeriodRecordView.get cursor page', PeriodRecord, {
+            'filter': {'user_id_hash': user_id_hash, '$or': [
+                {'start_datetime': {'$lt': now}},
+                {'start_datetime': now, 'period_record_id': {'$lt': record_id}},
+            ]},
+            'sort': {'start_datetime': -1, 'period_record_id': -1}, 'limit': 11,
+        }),
+        ('PeriodRecordView.get details', PeriodRecord, {'filter': {'period_record_id': record_id}, 'limit': 1}),
+        ('CycleHistory.for_user', PeriodRecord, {'filter': {'user_id_hash': user_id_hash}, 'sort': {'start_datetime': 1}}),
+        ('update_period_records', PeriodRecord, {
+            'filter': {'current_status': ongoing, 'start_datetime': {'$lte': now}, 'end_datetime': None},
+        }),
+        ('precompute_cycle_predictions', PeriodRecord, {
+            'filter': {'current_status': completed}, 'sort': {'user_id_hash': 1, 'start_datetime': 1},
+        }),
+        ('SymptomsRecordView.get listing', SymptomsRecord, {
+            'filter': {'user_id_hash': user_id_hash, 'created_datetime': {'$gte': now - timedelta(days=365), '$lte': now}},
+            'sort': {'created_datetime': -1, 'symptom_id': -1}, 'limit': 11,
+        }),
+        ('SymptomsRecordView.get page', SymptomsRecord, {
+            'filter': {'user_id_hash': user_id_hash, 'created_datetime': {'$gte': now - timedelta(days=365 * 100), '$lte': now}},
+            'sort': {'created_datetime': -1}, 'skip': 10, 'limit': 10,
+        }),
+        ('SymptomsRecordView.get by occurence', SymptomsRecord, {
+            'filter': {
+                'user_id_hash': user_id_hash, 'created_datetime': {'$gte': now - timedelta(days=365 * 100), '$lte': now},
+                'symptom_occurence': SymptomsRecord.SymptomOccurence.DURING_PERIOD.value,
+            },
+            'sort': {'created_datetime': -1}, 'limit': 10,
+        }),
+        ('symptoms of a period record', SymptomsRecord, {'filter': {'period_record_id': record_id}}),
+        ('CurrentPeriod lookup', CurrentPeriod, {'filter': {'user_id_hash': user_id_hash}, 'limit': 1}),
+        ('CycleFeatures lookup', CycleFeatures, {'filter': {'user_id_hash': user_id_hash}, 'limit': 1}),
+        ('PhaseSnapshot lookup', PhaseSnapshot, {'filter': {'user_id_hash': user_id_hash}, 'limit': 1}),
+        ('CyclePreditction lookup', CyclePreditction, {'filter': {'user_id_hash': user_id_hash}, 'limit': 1}),
+        ('login', User, {'filter': {'email': email}, 'limit': 1}),
+        ('auth middleware', User, {'filter': {'user_id_hash': user_id_hash}, 'limit': 1}),
+        ('UserDetails lookup', UserDetails, {'filter': {'user_id_hash': user_id_hash}, 'limit': 1}),
+    ]
+
+
+def pipeline_plans(user_id_hash):
+    """
+    (description, model, pipeline, scans_collection) for the aggregations the views and tasks
+    run, taken from the functions that build them. `scans_collection` marks a pipeline that
+    reads the whole collection on purpose, only its $lookup joins have to use an index.
+    """
+    return [
+        ('UserCycleContext.load', CurrentPeriod, UserCycleContext.pipeline(user_id_hash), False),
+        ('get_cycle_statistics_mongo', PeriodRecord, cycle_statistics_pipeline([user_id_hash]), False),
+        ('snapshot_cycle_phases', CurrentPeriod, UserCycleContext.lookup_stages(include_dashboard_data=False), True),
+    ]
+
+
+def _substitute(value, variables):
+    """`value` with every $$variable replaced by its value"""
+    if isinstance(value, dict):
+        return {key: _substitute(item, variables) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_substitute(item, variables) for item in value]
+    if isinstance(value, str) and value in variables:
+        return variables[value]
+    return value
+
+
+def lookup_pipelines(pipeline, document):
+    """
+    (foreign collection, pipeline) of the query every $lookup in `pipeline` runs per joined
+    document, with the fields of `document` filled in for its let variables / localField
+    """
+    lookups = []
+    for stage in pipeline:
+        lookup = stage.get('$lookup')
+        if not lookup:
+            continue
+        if 'localField' in lookup:
+            lookup_pipeline = [{'$match': {lookup['foreignField']: document.get(lookup['localField'])}}]
+        else:
+            variables = {f'$${name}': document.get(field.lstrip('$')) for name, field in lookup.get('let', {}).items()}
+            lookup_pipeline = _substitute(lookup['pipeline'], variables)
+        lookups.append((lookup['from'], lookup_pipeline))
+    return lookups
+
+
+def find_duplicates(collection, keys, limit=DUPLICATES_SHOWN):
+    """Up to `limit` key values held by more than one document, each as {'_id': {field: value}, 'count': n}"""
+    return list(collection.aggregate([
+        {'$group': {'_id': {field: f'${field}' for field, _ in keys}, 'count': {'$sum': 1}}},
+        {'$match': {'count': {'$gt': 1}}},
+        {'$sort': {'count': -1}},
+        {'$limit': limit},
+    ], allowDiskUse=True))
+
+
+def index_keys(keys):
+    """Comparable form of an index key specification"""
+    return tuple((field, int(direction)) for field, direction in keys)
+
+
+def find_collection_scans(plan):
+    """Every COLLSCAN stage in an explain output"""
+    if isinstance(plan, dict):
+        scans = [plan] if plan.get('stage') == 'COLLSCAN' else []
+        for key, value in plan.items():
+            # Rejected plans are not what runs
+            if key != 'rejectedPlans':
+                scans += find_collection_scans(value)
+        return scans
+    if isinstance(plan, list):
+        return [scan for value in plan for scan in find_collection_scans(value)]
+    return []
+
+
+class Command(BaseCommand):
+    help = (
+        'Create and reconcile the MONGO_INDEXES declared on the models, then fail if any hot query or aggregation '
+        'plans a collection scan'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only print the index changes')
+        parser.add_argument('--skip-explain', action='store_true', help='Do not verify the query plans')
+        parser.add_argument('--explain-only', action='store_true', help='Only verify the query plans')
+
+    def handle(self, *args, **options):
+        connection.ensure_connection()
+        database = connection.connection
+
+        duplicated = []
+        if not options['explain_only']:
+            for model in apps.get_models():
+                if getattr(model, 'MONGO_INDEXES', None):
+                    duplicated += self._sync_model_indexes(database[model._meta.db_table], model.MONGO_INDEXES, options['dry_run'])
+
+        if not options['skip_explain'] and not options['dry_run']:
+            self._verify_query_plans(database)
+
+        if duplicated:
+            raise CommandError(f'Unique indexes not created because of duplicate keys: {", ".join(duplicated)}')
+
+    def _sync_model_indexes(self, collection, specs, dry_run):
+        """Reconcile one collection's managed indexes, returns the unique ones skipped over duplicate keys"""
+        existing = collection.index_information()
+        existing_keys = {index_keys(index['key']): name for name, index in existing.items()}
+        wanted = {f"{INDEX_PREFIX}{spec['name']}": spec for spec in specs}
+
+        # Managed indexes that were removed from the spec or whose definition changed
+        for name, index in existing.items():
+            if not name.startswith(INDEX_PREFIX):
+                continue
+            spec = wanted.get(name)
+            if spec and index_keys(index['key']) == index_keys(spec['keys']) and index.get('unique', False) == spec.get('unique', False):
+                continue
+            self.stdout.write(f'{collection.name}: dropping {name}')
+            if not dry_run:
+                collection.drop_index(name)
+            existing_keys = {keys: existing_name for keys, existing_name in existing_keys.items() if existing_name != name}
+
+        to_create, duplicated = [], []
+        for name, spec in wanted.items():
+            keys = index_keys(spec['keys'])
+            if existing_keys.get(keys) == name:
+                continue
+            if keys in existing_keys:
+                # Same keys already indexed under another name (e.g. created by djongo), nothing to add
+                self.stdout.write(f'{collection.name}: {name} already covered by {existing_keys[keys]}')
+                continue
+            # A unique index cannot be built over duplicates, they are reported for cleanup instead
+            if spec.get('unique', False) and (duplicates := find_duplicates(collection, spec['keys'])):
+                self.stdout.write(self.style.ERROR(f'{collection.name}: cannot create {name}, duplicate keys:'))
+                for duplicate in duplicates:
+                    self.stdout.write(f'    {duplicate["_id"]} x{duplicate["count"]}')
+                duplicated.append(f'{collection.name}.{name}')
+                continue
+            self.stdout.write(f'{collection.name}: creating {name} {spec["keys"]}')
+            to_create.append(IndexModel(spec['keys'], name=name, unique=spec.get('unique', False)))
+
+        if to_create and not dry_run:
+            collection.create_indexes(to_create)
+
+        return duplicated
+
+    def _verify_query_plans(self, database):
+        # Real values where there are any, the plans do not depend on them otherwise
+        sample = database[PeriodRecord._meta.db_table].find_one({}, {'user_id_hash': 1, 'period_record_id': 1}) or {}
+        sample_user = database[User._meta.db_table].find_one({}, {'email': 1}) or {}
+        plans = query_plans(
+            user_id_hash=sample.get('user_id_hash', 'explain'),
+            email=sample_user.get('email', 'explain@example.com'),
+            record_id=sample.get('period_record_id', 'explain'),
+        )
+
+        explains = [
+            (description, model._meta.db_table, {'find': model._meta.db_table, **find})
+            for description, model, find in plans
+        ]
+        # The aggregations as their builders produce them, each $lookup also explained as the
+        # query it runs on the joined collection, where a $expr join misses the index before MongoDB 5.0
+        document = {'user_id_hash': sample.get('user_id_hash', 'explain')}
+        for description, model, pipeline, scans_collection in pipeline_plans(document['user_id_hash']):
+            if not scans_collection:
+                explains.append((description, model._meta.db_table, {'aggregate': model._meta.db_table, 'pipeline': pipeline, 'cursor': {}}))
+            for collection, lookup_pipeline in lookup_pipelines(pipeline, document):
+                explains.append((f'{description} $lookup', collection, {'aggregate': collection, 'pipeline': lookup_pipeline, 'cursor': {}}))
+
+        failures = []
+        for description, collection, command in explains:
+            try:
+                explain = database.command('explain', command, verbosity='queryPlanner')
+            except OperationFailure as e:
+                # e.g. $setWindowFields before MongoDB 5.0, where the statistics fall back to the app
+                self.stdout.write(self.style.WARNING(f'skipped   {description}: {e}'))
+                continue
+            # Rejected plans are skipped, the rest covers both find and aggregate explain layouts
+            if find_collection_scans(explain):
+                failures.append(description)
+                self.stdout.write(self.style.ERROR(f'COLLSCAN  {description} on {collection}'))
+            else:
+                self.stdout.write(f'ok        {description} on {collection}')
+
+        if failures:
+            raise CommandError(f'{len(failures)} queries would scan a whole collection: {", ".join(failures)}')
+
+        self.stdout.write(self.style.SUCCESS(f'All {len(explains)} query plans use an index'))
@@ -0,0 +1,32 @@
+# Generated by Django 4.1.13 on 2026-10-18 09:30
+
+from django.db import migrations, models
+import djongo.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cycles', '0007_currentperiod_history_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CycleFeatures',
+            fields=[
+                ('user_id_hash', models.CharField(editable=False, max_length=200, primary_key=True, serialize=False)),
+                ('recent_cycle_lengths', djongo.models.fields.JSONField(default=list)),
+                ('recent_period_durations', djongo.models.fields.JSONField(default=list)),
+                ('cycle_length_sum', models.IntegerField(default=0)),
+                ('cycle_length_count', models.IntegerField(default=0)),
+                ('period_duration_sum', models.IntegerField(default=0)),
+                ('period_duration_count', models.IntegerField(default=0)),
+                ('last_start_datetime', models.DateTimeField(blank=True, null=True)),
+                ('last_completed_start_datetime', models.DateTimeField(blank=True, null=True)),
+                ('update_datetime', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'cycle_features',
+            },
+        ),
+    ]
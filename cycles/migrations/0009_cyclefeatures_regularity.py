@@ -0,0 +1,28 @@
+# Generated by Django 4.1.13 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cycles', '0008_cyclefeatures'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cyclefeatures',
+            name='cycle_length_mean',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='cyclefeatures',
+            name='cycle_length_m2',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='cyclefeatures',
+            name='cycle_length_ewma',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.1.13 on 2026-10-18 09:00
+
+from django.db import migrations
+import djongo.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cycles', '0009_cyclefeatures_regularity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cyclefeatures',
+            name='phase_offsets',
+            field=djongo.models.fields.JSONField(blank=True, null=True),
+        ),
+    ]
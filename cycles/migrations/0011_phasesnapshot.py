@@ -0,0 +1,29 @@
+# Generated by Django 4.1.13 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cycles', '0010_cyclefeatures_phase_offsets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhaseSnapshot',
+            fields=[
+                ('user_id_hash', models.CharField(editable=False, max_length=200, primary_key=True, serialize=False)),
+                ('snapshot_date', models.DateField()),
+                ('phase', models.IntegerField(blank=True, null=True)),
+                ('cycle_day', models.IntegerField(blank=True, null=True)),
+                ('days_until_next_phase', models.IntegerField(blank=True, null=True)),
+                ('current_period_record_id', models.CharField(blank=True, max_length=200, null=True)),
+                ('last_period_record_id', models.CharField(blank=True, max_length=200, null=True)),
+                ('update_datetime', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'phase_snapshot',
+            },
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.1.13 on 2026-10-18 09:00
+
+from django.db import migrations
+import djongo.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cycles', '0011_phasesnapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cyclefeatures',
+            name='cycle_length_prefix_sums',
+            field=djongo.models.fields.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='cyclefeatures',
+            name='period_duration_prefix_sums',
+            field=djongo.models.fields.JSONField(default=list),
+        ),
+    ]
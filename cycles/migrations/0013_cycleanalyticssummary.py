@@ -0,0 +1,32 @@
+# Generated by Django 4.1.13 on 2026-10-18 09:00
+
+from django.db import migrations, models
+import djongo.models.fields
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cycles', '0012_cyclefeatures_prefix_sums'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CycleAnalyticsSummary',
+            fields=[
+                ('summary_id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('users_count', models.IntegerField(default=0)),
+                ('period_records_count', models.IntegerField(default=0)),
+                ('cycle_length', djongo.models.fields.JSONField(default=dict)),
+                ('period_duration', djongo.models.fields.JSONField(default=dict)),
+                ('prediction_error', djongo.models.fields.JSONField(default=dict)),
+                ('wall_time_seconds', models.FloatField(default=0.0)),
+                ('records_per_second', models.FloatField(default=0.0)),
+                ('create_datetime', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'cycle_analytics_summary',
+            },
+        ),
+    ]
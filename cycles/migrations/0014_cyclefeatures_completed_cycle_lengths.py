@@ -0,0 +1,24 @@
+# Generated by Django 4.1.13 on 2026-10-18 09:00
+
+from django.db import migrations, models
+import djongo.models.fields
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cycles', '0013_cycleanalyticssummary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cyclefeatures',
+            name='recent_completed_cycle_lengths',
+            field=djongo.models.fields.JSONField(default=list),
+        ),
+        migrations.AddField(
+            model_name='cyclefeatures',
+            name='features_version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
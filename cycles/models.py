@@ -58,6 +58,17 @@ class PhaseDuration(enum.Enum):
 class PeriodRecord(models.Model):
     class Meta:
         db_table = 'period_record'
+    
+    # Declarative MongoDB indexes, created and reconciled by `manage.py sync_indexes`
+    MONGO_INDEXES: ClassVar[list] = [
+        {'name': 'period_record_id', 'keys': [('period_record_id', 1)], 'unique': True},
+        # Listings, cursor pagination and every per-user history projection
+        {'name': 'user_start', 'keys': [('user_id_hash', 1), ('start_datetime', 1), ('period_record_id', 1)]},
+        # update_period_records
+        {'name': 'status_start', 'keys': [('current_status', 1), ('start_datetime', 1)]},
+        # precompute_cycle_predictions
+        {'name': 'status_user_start', 'keys': [('current_status', 1), ('user_id_hash', 1), ('start_datetime', 1)]},
+    ]
         
     class Event(enum.Enum):
         START = 1
@@ -76,14 +87,122 @@ class PeriodRecord(models.Model):
 class CurrentPeriod(models.Model):
     class Meta:
         db_table = 'current_period'
+    
+    MONGO_INDEXES: ClassVar[list] = [
+        {'name': 'user_id_hash', 'keys': [('user_id_hash', 1)], 'unique': True},
+    ]
+        
+    user_id_hash = models.CharField(max_length=200, primary_key=True, editable=False)
+    current_period_record_id = models.CharField(max_length=200, null=True, blank=True)
+    last_period_record_id = models.CharField(max_length=200, null=True, blank=True)
+    # Bumped every time a period is completed, predictions made from an older version are stale
+    history_version = models.IntegerField(default=0)
+    
+class CycleFeatures(models.Model):
+    """
+    Per-user cycle statistics maintained on every period START/END.
+    
+    `recent_cycle_lengths` holds the gaps between consecutive period starts (any status),
+    `recent_completed_cycle_lengths` the gaps between consecutive completed period starts (the
+    model input) and `recent_period_durations` the durations of completed periods, all oldest
+    first and capped to the last RECENT_WINDOW values. The sums and counts cover the full history.
+    
+    Cycle length regularity is tracked with running accumulators: Welford's mean and sum of
+    squared deviations (`cycle_length_m2`) and an exponentially weighted average.
+    
+    The prefix sums hold the running totals of all cycle lengths / period durations (starting
+    at 0), so the mean of any trailing window is one subtraction.
+    
+    `phase_offsets` holds the cycle day on which each phase starts (menstrual, follicular,
+    ovulation, luteal), personalized from the average cycle and period length.
+    """
+    class Meta:
+        db_table = 'cycle_features'
+    
+    MONGO_INDEXES: ClassVar[list] = [
+        {'name': 'user_id_hash', 'keys': [('user_id_hash', 1)], 'unique': True},
+    ]
+    
+    RECENT_WINDOW: ClassVar[int] = 12
+    # Weight of the newest cycle in the exponentially weighted average
+    EWMA_ALPHA: ClassVar[float] = 0.3
+    # Cycles varying by more than this many days (standard deviation) are flagged as irregular
+    IRREGULAR_STD_DAYS: ClassVar[float] = 7.0
+    IRREGULAR_MIN_CYCLES: ClassVar[int] = 3
+    # Bumped whenever what the features hold changes, stored features of an older version are rebuilt.
+    # 0 (stored before the version existed) may hold day counts from timedelta arithmetic instead of local calendar days
+    VERSION: ClassVar[int] = 1
         
     user_id_hash = models.CharField(max_length=200, primary_key=True, editable=False)
+    recent_cycle_lengths = models.JSONField(default=list)
+    recent_completed_cycle_lengths = models.JSONField(default=list)
+    recent_period_durations = models.JSONField(default=list)
+    cycle_length_sum = models.IntegerField(default=0)
+    cycle_length_count = models.IntegerField(default=0)
+    cycle_length_mean = models.FloatField(default=0.0)
+    cycle_length_m2 = models.FloatField(default=0.0)
+    cycle_length_ewma = models.FloatField(null=True, blank=True)
+    phase_offsets = models.JSONField(null=True, blank=True)
+    cycle_length_prefix_sums = models.JSONField(default=list)
+    period_duration_prefix_sums = models.JSONField(default=list)
+    period_duration_sum = models.IntegerField(default=0)
+    period_duration_count = models.IntegerField(default=0)
+    last_start_datetime = models.DateTimeField(null=True, blank=True)
+    last_completed_start_datetime = models.DateTimeField(null=True, blank=True)
+    features_version = models.IntegerField(default=0)
+    update_datetime = models.DateTimeField(auto_now=True)
+    
+class PhaseSnapshot(models.Model):
+    """
+    Each user's phase for `snapshot_date`, precomputed nightly by cycles.tasks.snapshot_cycle_phases.
+    
+    The period record ids it was computed from are kept, so a snapshot taken before a period was
+    started or ended is recognized as outdated.
+    """
+    class Meta:
+        db_table = 'phase_snapshot'
+    
+    MONGO_INDEXES: ClassVar[list] = [
+        {'name': 'user_id_hash', 'keys': [('user_id_hash', 1)], 'unique': True},
+    ]
+    
+    user_id_hash = models.CharField(max_length=200, primary_key=True, editable=False)
+    snapshot_date = models.DateField()
+    # Phases value, null when the phase is unknown
+    phase = models.IntegerField(null=True, blank=True)
+    cycle_day = models.IntegerField(null=True, blank=True)
+    days_until_next_phase = models.IntegerField(null=True, blank=True)
     current_period_record_id = models.CharField(max_length=200, null=True, blank=True)
     last_period_record_id = models.CharField(max_length=200, null=True, blank=True)
+    update_datetime = models.DateTimeField(auto_now=True)
+    
+class CycleAnalyticsSummary(models.Model):
+    """Population-wide cycle statistics written by every run of cycles.analytics.compute_population_analytics"""
+    class Meta:
+        db_table = 'cycle_analytics_summary'
+    
+    summary_id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
+    users_count = models.IntegerField(default=0)
+    period_records_count = models.IntegerField(default=0)
+    # Each one holds count, mean, std, percentiles and a histogram in whole days
+    cycle_length = models.JSONField(default=dict)
+    period_duration = models.JSONField(default=dict)
+    prediction_error = models.JSONField(default=dict)
+    wall_time_seconds = models.FloatField(default=0.0)
+    records_per_second = models.FloatField(default=0.0)
+    create_datetime = models.DateTimeField(auto_now_add=True)
     
 class SymptomsRecord(models.Model):
     class Meta:
         db_table = 'symptoms_record'
+    
+    MONGO_INDEXES: ClassVar[list] = [
+        {'name': 'symptom_id', 'keys': [('symptom_id', 1)], 'unique': True},
+        # Listings and cursor pagination
+        {'name': 'user_created', 'keys': [('user_id_hash', 1), ('created_datetime', 1), ('symptom_id', 1)]},
+        # Symptoms of one period record
+        {'name': 'period_record_id', 'keys': [('period_record_id', 1)]},
+    ]
         
     class SymptomOccurence(enum.Enum):
         DURING_PERIOD = 1
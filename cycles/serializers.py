@@ -11,6 +11,12 @@ class CreatePeriodRecordSerializer(BaseSerializer):
 class CreateSymptomsRecordSerializer(BaseSerializer):
     symptom = serializers.CharField(max_length=200)
     comments = serializers.CharField(max_length=500)
+
+
+class CreateSymptomsRecordsSerializer(BaseSerializer):
+    MAX_SYMPTOMS = 50
+
+    symptoms = CreateSymptomsRecordSerializer(many=True, allow_empty=False, max_length=MAX_SYMPTOMS)
     
     
 class FetchSymptomsRecordsSerializer(BaseSerializer):
@@ -26,4 +32,19 @@ class FetchPeriodRecordDetailsSerializer(BaseSerializer):
     user_id_hash = serializers.CharField(max_length=255)
     period_record_id = serializers.CharField(max_length=255)
     
-        
\ No newline at end of file
+
+class ImportedPeriodSerializer(BaseSerializer):
+    start_datetime = serializers.DateTimeField()
+    end_datetime = serializers.DateTimeField(required=False, allow_null=True)
+
+    def validate(self, data):
+        if data.get('end_datetime') and data['end_datetime'] <= data['start_datetime']:
+            raise serializers.ValidationError('end_datetime should be after start_datetime')
+
+        return data
+
+
+class ImportPeriodRecordsSerializer(BaseSerializer):
+    MAX_PERIODS = 1000
+
+    periods = ImportedPeriodSerializer(many=True, allow_empty=False, max_length=MAX_PERIODS)
@@ -0,0 +1,194 @@
+import math
+from itertools import groupby
+from logging import getLogger
+
+import numpy as np
+
+from django.conf import settings
+from django.db import connection
+from pymongo.errors import OperationFailure
+
+from cycles.history import CycleHistory
+from cycles.models import PeriodRecord
+
+logger = getLogger(__name__)
+
+STATISTICS_PRECISION = 4
+# Unrecognized pipeline stage / expression, what MongoDB older than 5.0 answers to $setWindowFields and $dateDiff
+UNSUPPORTED_PIPELINE_ERROR_CODES = (40324, 168)
+
+# Cleared the first time the server turns the pipeline down, the rest of the process uses the fallback
+_mongo_pipeline_supported = True
+
+
+def _summary_stages(value_field):
+    """$group/$project stages reducing one numeric field to count, mean, median, std, min and max per user"""
+    return [
+        {'$sort': {value_field: 1}},
+        {'$group': {
+            '_id': '$user_id_hash',
+            'values': {'$push': f'${value_field}'},
+            'count': {'$sum': 1},
+            'mean': {'$avg': f'${value_field}'},
+            'std': {'$stdDevPop': f'${value_field}'},
+            'min': {'$min': f'${value_field}'},
+            'max': {'$max': f'${value_field}'},
+        }},
+        # The sorted values never leave the server, only the middle one (or two) is picked
+        {'$project': {
+            '_id': 0,
+            'user_id_hash': '$_id',
+            'count': 1,
+            'mean': 1,
+            'std': 1,
+            'min': 1,
+            'max': 1,
+            'median': {'$cond': [
+                {'$eq': [{'$mod': ['$count', 2]}, 1]},
+                {'$arrayElemAt': ['$values', {'$toInt': {'$floor': {'$divide': ['$count', 2]}}}]},
+                {'$avg': [
+                    {'$arrayElemAt': ['$values', {'$toInt': {'$subtract': [{'$divide': ['$count', 2]}, 1]}}]},
+                    {'$arrayElemAt': ['$values', {'$toInt': {'$divide': ['$count', 2]}}]},
+                ]},
+            ]},
+        }},
+    ]
+
+
+def _days_between(later_field, earlier_field):
+    """Calendar days between two date fields in the local timezone, like cycles.history.days_between"""
+    return {'$dateDiff': {'startDate': earlier_field, 'endDate': later_field, 'unit': 'day', 'timezone': settings.TIME_ZONE}}
+
+
+def _summarize(values):
+    """Pure-Python equivalent of _summary_stages"""
+    if not len(values):
+        return None
+
+    return {
+        'count': len(values),
+        'mean': float(np.mean(values)),
+        'median': float(np.median(values)),
+        'std': float(np.std(values)),
+        'min': int(np.min(values)),
+        'max': int(np.max(values)),
+    }
+
+
+def _empty_statistics():
+    return {'cycle_length': None, 'period_duration': None}
+
+
+def cycle_statistics_pipeline(user_id_hashes):
+    """The period_record aggregation behind get_cycle_statistics_mongo"""
+    return [
+        {'$match': {'user_id_hash': {'$in': list(user_id_hashes)}}},
+        {'$facet': {
+            'cycle_length': [
+                {'$setWindowFields': {
+                    'partitionBy': '$user_id_hash',
+                    'sortBy': {'start_datetime': 1},
+                    'output': {'previous_start_datetime': {'$shift': {'output': '$start_datetime', 'by': -1}}},
+                }},
+                {'$match': {'previous_start_datetime': {'$ne': None}}},
+                {'$project': {'user_id_hash': 1, 'value': _days_between('$start_datetime', '$previous_start_datetime')}},
+                *_summary_stages('value'),
+            ],
+            'period_duration': [
+                {'$match': {'current_status': PeriodRecord.CurrentStatus.COMPLETED.value, 'end_datetime': {'$ne': None}}},
+                {'$project': {'user_id_hash': 1, 'value': _days_between('$end_datetime', '$start_datetime')}},
+                *_summary_stages('value'),
+            ],
+        }},
+    ]
+
+
+def get_cycle_statistics_mongo(user_id_hashes):
+    """
+    Cycle length and period duration statistics of every user in `user_id_hashes`, computed by
+    one aggregation pipeline
+
+    Cycle lengths are the gaps between consecutive period starts (any status), period durations
+    come from completed periods. Requires MongoDB 5.0+ for $setWindowFields and $dateDiff.
+
+    Returns:
+        {user_id_hash: {'cycle_length': summary or None, 'period_duration': summary or None}}
+    """
+    connection.ensure_connection()
+    result = next(connection.connection[PeriodRecord._meta.db_table].aggregate(cycle_statistics_pipeline(user_id_hashes)), None) or {}
+
+    cycle_statistics = {user_id_hash: _empty_statistics() for user_id_hash in user_id_hashes}
+    for key in ('cycle_length', 'period_duration'):
+        for summary in result.get(key, []):
+            cycle_statistics[summary.pop('user_id_hash')][key] = summary
+
+    return cycle_statistics
+
+
+def get_cycle_statistics_python(user_id_hashes):
+    """Fallback computing the same numbers as get_cycle_statistics_mongo from each user's CycleHistory, in one query"""
+    cycle_statistics = {user_id_hash: _empty_statistics() for user_id_hash in user_id_hashes}
+
+    period_records = PeriodRecord.objects.filter(user_id_hash__in=list(user_id_hashes)).order_by('user_id_hash', 'start_datetime').values_list(
+        'user_id_hash', 'start_datetime', 'end_datetime', 'current_status'
+    )
+    for user_id_hash, records in groupby(period_records, key=lambda record: record[0]):
+        history = CycleHistory.from_records(record[1:] for record in records)
+        cycle_statistics[user_id_hash] = {
+            'cycle_length': _summarize(history.cycle_lengths),
+            'period_duration': _summarize(history.period_durations),
+        }
+
+    return cycle_statistics
+
+
+def get_users_cycle_statistics(user_id_hashes):
+    """
+    Count, mean, median, standard deviation, min and max of each user's cycle lengths and
+    period durations, server-side unless CYCLE_STATS_BACKEND is 'python' or the server does
+    not support the pipeline
+
+    Returns:
+        {user_id_hash: {'cycle_length': summary or None, 'period_duration': summary or None}}
+    """
+    global _mongo_pipeline_supported
+
+    if settings.CYCLE_STATS_BACKEND == 'mongo' and _mongo_pipeline_supported:
+        try:
+            return {
+                user_id_hash: _normalize(cycle_statistics)
+                for user_id_hash, cycle_statistics in get_cycle_statistics_mongo(user_id_hashes).items()
+            }
+        except Exception as e:
+            if isinstance(e, OperationFailure) and e.code in UNSUPPORTED_PIPELINE_ERROR_CODES:
+                _mongo_pipeline_supported = False
+                logger.warning(f"MongoDB does not support the cycle statistics pipeline ({e}), computing them in the app from now on")
+            else:
+                logger.error(f"Error computing cycle statistics with the aggregation pipeline: {e}")
+
+    return {
+        user_id_hash: _normalize(cycle_statistics)
+        for user_id_hash, cycle_statistics in get_cycle_statistics_python(user_id_hashes).items()
+    }
+
+
+def get_cycle_statistics(user_id_hash):
+    """get_users_cycle_statistics of a single user, the source of every average cycle/period length"""
+    return get_users_cycle_statistics([user_id_hash])[user_id_hash]
+
+
+def _normalize(cycle_statistics):
+    """
+    Same numbers from both backends: int counts/min/max, mean/median/std rounded so that
+    floating point summation order in MongoDB cannot make the results differ
+    """
+    for summary in cycle_statistics.values():
+        if summary is None:
+            continue
+        for key in ('count', 'min', 'max'):
+            summary[key] = int(summary[key])
+        for key in ('mean', 'median', 'std'):
+            value = summary[key]
+            summary[key] = round(float(value), STATISTICS_PRECISION) if value is not None and not math.isnan(value) else None
+
+    return cycle_statistics
@@ -1,33 +1,144 @@
 from celery import shared_task
-from datetime import datetime, timedelta
-from cycles.models import PeriodRecord, CurrentPeriod
+from datetime import date, timedelta
+from logging import getLogger
+from time import perf_counter
+from django.db import connection
+from django.utils import timezone
+from cycles.analytics import compute_population_analytics
+from cycles.cache import invalidate_user_cache
+from cycles.context import UserCycleContext
+from cycles.models import PeriodRecord, CurrentPeriod, PhaseSnapshot
+from cycles.features import record_period_end
+from cycles.stats import get_users_cycle_statistics
+from cycles.utils import build_phase_snapshot, bump_history_version
+from predictions.utils import queue_prediction_refresh
+from utils.helpers import bulk_upsert
+
+logger = getLogger(__name__)
+
+# A snapshot is for the local day starting closest to its run, so the 23:00 run (or one that is
+# delayed past midnight) covers the coming day
+SNAPSHOT_DAY_LEAD = timedelta(hours=12)
 
 @shared_task
 def update_period_records():
+    now = timezone.now()
+    threshold_datetime = now - timedelta(days=7)
+    
+    # Get all the ongoing period records which have not been updated for more than 7 days
+    records_to_update = PeriodRecord.objects.filter(
+        current_status=PeriodRecord.CurrentStatus.ONGOING,
+        start_datetime__lte=threshold_datetime,
+        end_datetime=None
+    )
+    
+    # Update the end_datetime for the records, one user failing does not stop the others
+    for record in records_to_update:
+        try:
+            _close_period_record(record, now)
+        except Exception as e:
+            logger.error(f"Error closing period record {record.period_record_id} of {record.user_id_hash}: {e}")
+
+
+def _close_period_record(record, end_datetime):
+    record.end_datetime = end_datetime
+    record.current_status = PeriodRecord.CurrentStatus.COMPLETED
+    record.save()
+    
+    user_id_hash = record.user_id_hash
+    
+    # Free the current period first, so the user can start the next one whatever fails below
+    current_period = CurrentPeriod.objects.get(user_id_hash=user_id_hash)
+    
+    current_period.current_period_record_id = None
+    current_period.last_period_record_id = record.period_record_id
+    bump_history_version(current_period)
+    current_period.save()
+    
     try:
-        threshold_datetime = datetime.now() - timedelta(days=7)
-        
-        # Get all the ongoing period records which have not been updated for more than 7 days
-        records_to_update = PeriodRecord.objects.filter(
-            current_status=PeriodRecord.CurrentStatus.ONGOING,
-            start_datetime__lte=threshold_datetime,
-            end_datetime=None
-        )
+        record_period_end(user_id_hash, record.start_datetime, record.end_datetime)
+    finally:
+        invalidate_user_cache(user_id_hash)
+    
+    queue_prediction_refresh(user_id_hash, current_period.history_version)
+
+
+def _snapshot_chunk(contexts, snapshot_date):
+    """Snapshots of a chunk of users, with the cycle statistics of the whole chunk from one aggregation"""
+    cycle_statistics = get_users_cycle_statistics([context.user_id_hash for context in contexts])
+    for context in contexts:
+        context.cycle_statistics = cycle_statistics[context.user_id_hash]
+
+    return [build_phase_snapshot(context, snapshot_date) for context in contexts]
+
+
+def _upsert_phase_snapshots(snapshots):
+    """Write a chunk of snapshots with one bulk upsert"""
+    user_id_hashes = [snapshot.user_id_hash for snapshot in snapshots]
+    bulk_upsert(PhaseSnapshot, snapshots)
+    
+    # Cached dashboards pick the new snapshot up once its day starts
+    invalidate_user_cache(*user_id_hashes)
+
+
+@shared_task
+def snapshot_cycle_phases(chunk_size=500, snapshot_date=None):
+    """
+    Precompute every user's phase, cycle day and days until the next phase for the coming day
+    
+    One aggregation over current_period joined with each user's latest period records and cycle
+    features is streamed in batches of `chunk_size`, and each batch is written with bulk upserts.
+    
+    Args:
+        snapshot_date: ISO date to snapshot, defaults to the local day starting closest to now
+    """
+    started = perf_counter()
+    if snapshot_date:
+        snapshot_date = date.fromisoformat(snapshot_date)
+    else:
+        snapshot_date = timezone.localdate(timezone.now() + SNAPSHOT_DAY_LEAD)
+    
+    connection.ensure_connection()
+    documents = connection.connection[CurrentPeriod._meta.db_table].aggregate(
+        UserCycleContext.lookup_stages(include_dashboard_data=False), allowDiskUse=True, batchSize=chunk_size
+    )
+    
+    users_processed = 0
+    chunk = []
+    for document in documents:
+        chunk.append(UserCycleContext.from_document(document))
         
-        # Update the end_datetime for the records
-        for record in records_to_update:
-            record.end_datetime = datetime.now()
-            record.save()
-            
-            user_id_hash = record.user_id_hash
-            
-            # Update the current period record for the user
-            current_period = CurrentPeriod.objects.get(user_id_hash=user_id_hash)
-            
-            current_period.current_period_record_id = None
-            current_period.last_period_record_id = record.period_record_id
-            current_period.save()
-            
-    except Exception as e:
-        print(e)
-        pass
+        if len(chunk) >= chunk_size:
+            _upsert_phase_snapshots(_snapshot_chunk(chunk, snapshot_date))
+            users_processed += len(chunk)
+            chunk = []
+    
+    if chunk:
+        _upsert_phase_snapshots(_snapshot_chunk(chunk, snapshot_date))
+        users_processed += len(chunk)
+    
+    wall_time = perf_counter() - started
+    users_per_second = users_processed / wall_time if wall_time else 0
+    
+    logger.info(f"Snapshotted phases for {snapshot_date} of {users_processed} users in {wall_time:.2f}s ({users_per_second:.1f} users/s)")
+    
+    return {
+        'snapshot_date': str(snapshot_date),
+        'users_processed': users_processed,
+        'wall_time_seconds': wall_time,
+        'users_per_second': users_per_second
+    }
+
+
+@shared_task
+def population_analytics(chunk_size=500):
+    """Celery entry point of cycles.analytics.compute_population_analytics"""
+    summary = compute_population_analytics(chunk_size=chunk_size)
+    
+    return {
+        'summary_id': str(summary.summary_id),
+        'users_count': summary.users_count,
+        'period_records_count': summary.period_records_count,
+        'wall_time_seconds': summary.wall_time_seconds,
+        'records_per_second': summary.records_per_second
+    }
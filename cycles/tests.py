@@ -0,0 +1,107 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+
+from cycles.calendar import calendar_history, get_cycle_calendar
+from cycles.cache import DASHBOARD, get_cached_payload, get_cache_stats
+from cycles.features import build_cycle_features, get_model_input
+from cycles.history import CycleHistory
+from cycles.models import PeriodRecord, Phases
+
+COMPLETED = PeriodRecord.CurrentStatus.COMPLETED
+ONGOING = PeriodRecord.CurrentStatus.ONGOING
+
+
+def period(start_day, duration, status=COMPLETED):
+    start_datetime = timezone.make_aware(datetime(2025, 1, 1, 9, 0)) + timedelta(days=start_day)
+    return start_datetime, start_datetime + timedelta(days=duration) if duration is not None else None, status
+
+
+class ModelInputTests(SimpleTestCase):
+
+    def test_completed_history(self):
+        records = [period(0, 5), period(28, 5), period(56, 4), period(84, 5), period(112, None, ONGOING)]
+
+        last_three_cycles, last_period_date = get_model_input(build_cycle_features('user', records))
+        model_input, _ = CycleHistory.from_records(records).model_input()
+
+        self.assertEqual(last_three_cycles, [[28, 5], [28, 5], [28, 4]])
+        self.assertEqual(last_three_cycles, model_input.tolist())
+        self.assertEqual(last_period_date, records[3][0])
+
+    def test_ongoing_record_mid_history(self):
+        # Auto-closed before COMPLETED was set on close: ONGOING with an end, in the middle of the history
+        records = [period(0, 5), period(28, 5), period(56, 5, ONGOING), period(84, 5), period(112, 5)]
+
+        last_three_cycles, last_period_date = get_model_input(build_cycle_features('user', records))
+        model_input, _ = CycleHistory.from_records(records).model_input()
+
+        self.assertEqual(last_three_cycles, [[28, 5], [56, 5], [28, 5]])
+        self.assertEqual(last_three_cycles, model_input.tolist())
+        self.assertEqual(last_period_date, records[4][0])
+        # prepare_input_from_history predicts from the same recorded start, not its local midnight
+        self.assertEqual(CycleHistory.from_records(records).only_completed().last_start_datetime, last_period_date)
+
+    def test_not_enough_completed_periods(self):
+        records = [period(0, 5), period(28, 5), period(56, 5, ONGOING), period(84, 5)]
+
+        self.assertIsNone(get_model_input(build_cycle_features('user', records)))
+        self.assertIsNone(CycleHistory.from_records(records).model_input())
+
+
+class PayloadCacheTests(SimpleTestCase):
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_disabled_on_process_local_backend(self):
+        builds = []
+
+        for _ in range(2):
+            payload = get_cached_payload(DASHBOARD, 'user', lambda: builds.append(1) or {'phase': 1})
+
+        self.assertEqual(payload, {'phase': 1})
+        self.assertEqual(len(builds), 2)
+        self.assertIsNone(get_cache_stats())
+
+
+class CycleCalendarTests(SimpleTestCase):
+
+    def setUp(self):
+        # 28 day cycles, the latest period started 23 days ago, the next one is predicted in 5 days
+        self.today = timezone.localdate()
+        last_start = timezone.make_aware(datetime.combine(self.today - timedelta(days=23), datetime.min.time())) + timedelta(hours=9)
+        self.records = [
+            (last_start - timedelta(days=28 * cycle), last_start - timedelta(days=28 * cycle - 5), COMPLETED)
+            for cycle in range(4, -1, -1)
+        ]
+        self.context = mock.Mock(features=build_cycle_features('user', self.records))
+        self.prediction = {
+            'next_period_start': last_start + timedelta(days=28),
+            'cycle_length': 28,
+            'period_duration': 5,
+        }
+
+    def calendar(self, start_offset, end_offset):
+        with mock.patch('cycles.calendar.get_calendar_periods', return_value=calendar_history(self.records[-1:])), \
+                mock.patch('cycles.calendar.get_cycle_prediction', return_value=(self.prediction, None, None)):
+            return get_cycle_calendar('user', self.today + timedelta(days=start_offset), self.today + timedelta(days=end_offset), self.context)
+
+    def test_range_starting_in_future_keeps_overlapping_prediction(self):
+        calendar = self.calendar(7, 40)
+
+        # The predicted period from today + 5 runs into the range
+        self.assertEqual(calendar['predicted_periods'][0]['start_date'], self.today + timedelta(days=7))
+        self.assertEqual(calendar['phases'][0]['phase'], Phases.MENSTRUAL.value)
+        self.assertTrue(calendar['fertile_windows'])
+        # Same days as when the range starts today
+        from_today = self.calendar(0, 40)
+        self.assertEqual(calendar['fertile_windows'], from_today['fertile_windows'])
+        self.assertEqual(calendar['predicted_periods'][1:], from_today['predicted_periods'][1:])
+
+    def test_legacy_ongoing_record_with_end(self):
+        start, end, _ = self.records[-1]
+        history = calendar_history([(start, end, ONGOING)])
+
+        self.assertEqual(history.ends.tolist(), calendar_history([(start, end, COMPLETED)]).ends.tolist())
+        self.assertEqual(calendar_history([(start, None, ONGOING)]).completed.tolist(), [False])
@@ -1,12 +1,16 @@
 from django.urls import path
 
-from cycles.views import DashboardDetailsView, DashboardView, GetPhaseDetailsView, PeriodRecordView, SymptomsRecordView, CurrentStatusView
+from cycles.views import CycleCalendarView, CycleStatsView, DashboardCacheStatsView, DashboardDetailsView, DashboardView, GetPhaseDetailsView, PeriodImportView, PeriodRecordView, SymptomsRecordView, CurrentStatusView
 
 urlpatterns = [
     path('periods/', PeriodRecordView.as_view(), name='period_record'),
+    path('periods/import/', PeriodImportView.as_view(), name='period_import'),
     path('symptoms/', SymptomsRecordView.as_view(), name='symptoms_record'),
     path('dashboard/', DashboardView.as_view(), name='dashboard'),
     path('dashboard/details/', DashboardDetailsView.as_view(), name='dashboard_details'),
+    path('dashboard/cache-stats/', DashboardCacheStatsView.as_view(), name='dashboard_cache_stats'),
     # path('details/', GetPhaseDetailsView.as_view(), name='get_phase_details'),
+    path('calendar/', CycleCalendarView.as_view(), name='cycle_calendar'),
+    path('stats/', CycleStatsView.as_view(), name='cycle_stats'),
     path('current-status/', CurrentStatusView.as_view(), name='current_status'),
 ]
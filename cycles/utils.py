@@ -1,27 +1,36 @@
+from bisect import bisect_right
+from datetime import datetime, time
 
 from django.utils import timezone
 
-from cycles.models import CurrentPeriod, PeriodRecord, PhaseDuration, Phases
+from cycles.features import get_cycle_features, get_phase_offsets
+from cycles.history import days_between
+from cycles.models import CurrentPeriod, PeriodRecord, Phases, PhaseSnapshot
+from cycles.stats import get_cycle_statistics
 
-def get_avg_cycle_length(user_id_hash):
-    """Returns the average cycle length for the user, or None if not enough data."""
-    period_records = PeriodRecord.objects.filter(user_id_hash=user_id_hash).order_by("-start_datetime").values("start_datetime")
+# Order of CycleFeatures.phase_offsets
+PHASE_ORDER = [Phases.MENSTRUAL, Phases.FOLLICULAR, Phases.OVULATION, Phases.LUTEAL]
 
-    if len(period_records) < 2:
-        return None  # Not enough records to calculate cycle length
 
-    cycle_lengths = [
-        (period_records[i]["start_datetime"] - period_records[i + 1]["start_datetime"]).days
-        for i in range(len(period_records) - 1)
-    ]
-    
+def bump_history_version(current_period):
+    """Mark the user's completed period history as changed. The caller is responsible for saving current_period."""
+    current_period.history_version = (current_period.history_version or 0) + 1
+    return current_period.history_version
+
 
-    return int(round(sum(cycle_lengths) / len(cycle_lengths))) if cycle_lengths else None
+def get_avg_cycle_length(user_id_hash, context=None):
+    """Returns the average cycle length for the user from their cycle statistics, or None if not enough data."""
+    summary = (context.cycle_statistics if context else get_cycle_statistics(user_id_hash))['cycle_length']
+
+    if not summary:
+        return None  # Not enough records to calculate cycle length
 
+    return int(round(summary['mean']))
 
-def get_current_phase(user_id_hash):
-    """Determines the current menstrual phase based on the last recorded period."""
-    current_period = CurrentPeriod.objects.filter(user_id_hash=user_id_hash).first()
+
+def get_current_phase(user_id_hash, context=None, now=None):
+    """Determines the current menstrual phase based on the last recorded period (as of `now`, by default the current time)."""
+    current_period = context.current_period if context else CurrentPeriod.objects.filter(user_id_hash=user_id_hash).first()
     if not current_period:
         return "Unknown", None
 
@@ -31,48 +40,77 @@ def get_current_phase(user_id_hash):
     if not current_period.last_period_record_id:
         return "Unknown", None
 
-    last_period = PeriodRecord.objects.filter(period_record_id=current_period.last_period_record_id).first()
+    if context:
+        last_period = context.last_period_record
+    else:
+        last_period = PeriodRecord.objects.filter(period_record_id=current_period.last_period_record_id).first()
     if not last_period:
         return "Unknown", None
 
-    date_of_last_period = last_period.start_datetime
-    today = timezone.now()
-    cycle_days = (today - date_of_last_period).days
+    features = context.features if context else get_cycle_features(user_id_hash)
+    return get_phase_since_period_start(last_period.start_datetime, get_phase_offsets(features), now=now)
 
-    if cycle_days < PhaseDuration.FOLLICULAR.value:
-        return Phases.FOLLICULAR, cycle_days
-    elif cycle_days < PhaseDuration.FOLLICULAR.value + PhaseDuration.OVULATION.value:
-        return Phases.OVULATION, cycle_days
-    else:
-        return Phases.LUTEAL, cycle_days
 
+def get_phase_for_cycle_day(cycle_days, phase_offsets):
+    """Binary search of the cycle day in the user's four phase start offsets, for a user who is not on their period."""
+    phase = PHASE_ORDER[max(bisect_right(phase_offsets, cycle_days) - 1, 0)]
+
+    # Shorter period than on average, it is over already
+    return Phases.FOLLICULAR if phase == Phases.MENSTRUAL else phase
 
-def get_days_until_next_phase(phase, cycle_days, avg_cycle_length):
+
+def get_phase_since_period_start(last_period_start, phase_offsets, now=None):
+    """Phase and cycle day of a user who is not on their period, counted from the start of their last period."""
+    if not last_period_start:
+        return "Unknown", None
+
+    cycle_days = days_between(now or timezone.now(), last_period_start)
+
+    return get_phase_for_cycle_day(cycle_days, phase_offsets), cycle_days
+
+
+def get_days_until_next_phase(phase, cycle_days, avg_cycle_length, phase_offsets):
     """Calculates the number of days until the next menstrual phase."""
     
     if phase == "Unknown" or cycle_days is None:
         return None  # Cannot determine the next phase
 
-    if phase == Phases.FOLLICULAR:
-        return max(0, PhaseDuration.FOLLICULAR.value - cycle_days)
-    elif phase == Phases.OVULATION:
-        return max(0, PhaseDuration.FOLLICULAR.value + PhaseDuration.OVULATION.value - cycle_days)
-    elif phase == Phases.LUTEAL:
+    if phase == Phases.LUTEAL:
         return max(0, avg_cycle_length - cycle_days) if avg_cycle_length else None  # Handle None case
 
+    if phase in PHASE_ORDER:
+        return max(0, phase_offsets[PHASE_ORDER.index(phase) + 1] - cycle_days)
+
     return None
 
 
-def get_avg_period_length(user_id_hash):
-    """Returns the average period length for the user, or None if not enough data."""
-    period_records = PeriodRecord.objects.filter(user_id_hash=user_id_hash, current_status=PeriodRecord.CurrentStatus.COMPLETED.value).order_by("-start_datetime").values("start_datetime", "end_datetime")
+def get_avg_period_length(user_id_hash, context=None):
+    """Returns the average period length for the user from their cycle statistics, or None if not enough data."""
+    summary = (context.cycle_statistics if context else get_cycle_statistics(user_id_hash))['period_duration']
 
-    if len(period_records) < 2:
+    if not summary or summary['count'] < 2:
         return None  # Not enough records to calculate period length
 
-    period_lengths = [
-        (period_records[i]["end_datetime"] - period_records[i]["start_datetime"]).days
-        for i in range(len(period_records))
-    ]
-
-    return int(round(sum(period_lengths) / len(period_lengths))) if period_lengths else None
+    return int(round(summary['mean']))
+
+
+def build_phase_snapshot(context, snapshot_date):
+    """The user's phase at the start of `snapshot_date` as an (unsaved) PhaseSnapshot."""
+    user_id_hash = context.user_id_hash
+    start_of_day = timezone.make_aware(datetime.combine(snapshot_date, time.min))
+
+    phase, cycle_days = get_current_phase(user_id_hash, context=context, now=start_of_day)
+    days_until_next_phase = get_days_until_next_phase(
+        phase, cycle_days, get_avg_cycle_length(user_id_hash, context=context), get_phase_offsets(context.features)
+    )
+
+    return PhaseSnapshot(
+        user_id_hash=user_id_hash,
+        snapshot_date=snapshot_date,
+        phase=None if phase == "Unknown" else phase.value,
+        cycle_day=cycle_days,
+        days_until_next_phase=days_until_next_phase,
+        current_period_record_id=context.current_period.current_period_record_id if context.current_period else None,
+        last_period_record_id=context.current_period.last_period_record_id if context.current_period else None,
+        update_datetime=timezone.now(),
+    )
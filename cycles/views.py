@@ -3,17 +3,21 @@ from logging import getLogger
 from django.conf import settings
 from django.forms import model_to_dict
 from django.utils import timezone
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from rest_framework.views import APIView
 from django.db.models import Q
 from google import genai
 
 from cycles.models import PeriodRecord, CurrentPeriod, Phases, SymptomsRecord, PhaseInfo, ExerciseDetails, LifestyleAdjustment, NutrientDetails, Recommendations, HealthWarning, Phases
-from cycles.serializers import CreatePeriodRecordSerializer, CreateSymptomsRecordSerializer, FetchPeriodRecordDetailsSerializer, FetchSymptomsRecordsSerializer
-from cycles.utils import get_avg_cycle_length, get_avg_period_length, get_current_phase, get_days_until_next_phase
-from predictions.utils import PeriodPredictionService, get_next_period_start_date
-from utils.helpers import convert_to_utc, forge
-from utils.exceptions import BadRequest, Conflict, ResourceNotFound
+from cycles.cache import CURRENT_STATUS, DASHBOARD, get_cache_stats, get_cached_payload, invalidate_user_cache
+from cycles.calendar import MAX_CALENDAR_DAYS, get_cycle_calendar
+from cycles.context import UserCycleContext
+from cycles.features import get_cycle_features, get_cycle_regularity, get_phase_offsets, get_windowed_stats, rebuild_cycle_features, record_period_end, record_period_start
+from cycles.serializers import CreatePeriodRecordSerializer, CreateSymptomsRecordSerializer, CreateSymptomsRecordsSerializer, FetchPeriodRecordDetailsSerializer, FetchSymptomsRecordsSerializer, ImportPeriodRecordsSerializer
+from cycles.utils import bump_history_version, get_avg_cycle_length, get_avg_period_length, get_days_until_next_phase, get_phase_since_period_start
+from predictions.utils import get_cycle_prediction, get_next_period_start_date, queue_prediction_refresh
+from utils.helpers import convert_to_utc, forge, paginate_by_cursor
+from utils.exceptions import BadRequest, Conflict, Forbidden, ResourceNotFound
 
 logger = getLogger(__name__)
 
@@ -25,6 +29,8 @@ class PeriodRecordView(APIView):
         user_id_hash = request.user_obj.user_id_hash
         
         period_record_id = request.query_params.get('period_record_id', None)
+        # Passing `cursor` (empty for the first page) switches from page numbers to keyset pagination
+        cursor = request.query_params.get('cursor', None)
         page = int(request.query_params.get('page', 1))
         rows_per_page = int(request.query_params.get('rows_per_page', 10))
         start_datetime = request.query_params.get('start_datetime', None)
@@ -82,7 +88,11 @@ class PeriodRecordView(APIView):
 
 
         # Paginate the period records
-        period_records = period_records.order_by('-start_datetime')[(page-1)*rows_per_page:(page)*rows_per_page].values()
+        next_cursor = None
+        if cursor is not None:
+            period_records, next_cursor = paginate_by_cursor(period_records, 'start_datetime', 'period_record_id', cursor, rows_per_page)
+        else:
+            period_records = period_records.order_by('-start_datetime')[(page-1)*rows_per_page:(page)*rows_per_page].values()
 
         period_records = [
             {
@@ -99,6 +109,8 @@ class PeriodRecordView(APIView):
             "message": "Period records fetched successfully",
             "period_records": period_records
         }
+        if cursor is not None:
+            response['next_cursor'] = next_cursor
         
         return response
     
@@ -133,6 +145,7 @@ class PeriodRecordView(APIView):
             )
             
             current_period.current_period_record_id = period_record.period_record_id
+            record_period_start(user_id_hash, period_record.start_datetime)
             
             response_body = {
                 'period_record_id': period_record.period_record_id,
@@ -156,10 +169,12 @@ class PeriodRecordView(APIView):
             period_record.end_datetime = date_time
             period_record.current_status = PeriodRecord.CurrentStatus.COMPLETED
             period_record.save()
+            record_period_end(user_id_hash, period_record.start_datetime, period_record.end_datetime)
             
             # Update the current period record
             current_period.last_period_record_id = period_record.period_record_id
             current_period.current_period_record_id = None
+            bump_history_version(current_period)
             
             response_body = {
                 'period_record_id': period_record.period_record_id,
@@ -170,12 +185,112 @@ class PeriodRecordView(APIView):
             
         current_period.save()
         
+        # A completed period changes the model input, recompute the prediction in the background
+        if event == PeriodRecord.Event.END:
+            queue_prediction_refresh(user_id_hash, current_period.history_version)
+        
+        invalidate_user_cache(user_id_hash)
+        
         response_body['message'] = 'Period record saved successfully'
         
         return response_body, 201
         
     
 
+class PeriodImportView(APIView):
+    
+    @forge
+    def post(self, request):
+        
+        user_id_hash = request.user_obj.user_id_hash
+        
+        serializer = ImportPeriodRecordsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        now = timezone.now()
+        periods = sorted(
+            (
+                (convert_to_utc(period['start_datetime']), convert_to_utc(period['end_datetime']) if period.get('end_datetime') else None)
+                for period in serializer.get_value('periods')
+            ),
+            key=lambda period: period[0]
+        )
+        
+        # Ids are generated client side, so the records can be validated and CurrentPeriod pointed at them before the insert
+        period_records = [
+            PeriodRecord(
+                user_id_hash=user_id_hash,
+                current_status=PeriodRecord.CurrentStatus.COMPLETED if end_datetime else PeriodRecord.CurrentStatus.ONGOING,
+                start_datetime=start_datetime,
+                end_datetime=end_datetime
+            )
+            for start_datetime, end_datetime in periods
+        ]
+        
+        ############################################################################################################
+        # Validate the imported periods together with the ones already recorded, in one pass over the sorted starts
+        ############################################################################################################
+        if periods[-1][0] > now or (periods[-1][1] and periods[-1][1] > now):
+            raise BadRequest('Imported periods cannot be in the future')
+        
+        # (start, end, period_record_id), end is None for a period that is still ongoing
+        timeline = sorted(
+            [
+                (start_datetime, end_datetime, period_record_id)
+                for period_record_id, start_datetime, end_datetime in PeriodRecord.objects.filter(user_id_hash=user_id_hash).values_list(
+                    'period_record_id', 'start_datetime', 'end_datetime'
+                )
+            ] + [
+                (period_record.start_datetime, period_record.end_datetime, period_record.period_record_id)
+                for period_record in period_records
+            ],
+            key=lambda period: period[0]
+        )
+        
+        for (start_datetime, end_datetime, _), (next_start_datetime, _, _) in zip(timeline, timeline[1:]):
+            if end_datetime is None:
+                raise BadRequest(f'Only the latest period can be ongoing, the one started at {start_datetime.isoformat()} has no end')
+            if end_datetime >= next_start_datetime:
+                raise Conflict(f'Period starting at {next_start_datetime.isoformat()} overlaps the one started at {start_datetime.isoformat()}')
+        
+        PeriodRecord.objects.bulk_create(period_records)
+        
+        _, latest_end, latest_record_id = timeline[-1]
+        last_completed = next((period for period in reversed(timeline) if period[1] is not None), None)
+        
+        current_period, _ = CurrentPeriod.objects.get_or_create(
+            user_id_hash=user_id_hash,
+            defaults={
+                'current_period_record_id':None,
+                'last_period_record_id':None
+            })
+        current_period.current_period_record_id = latest_record_id if latest_end is None else None
+        current_period.last_period_record_id = last_completed[2] if last_completed else None
+        if any(end_datetime for _, end_datetime in periods):
+            bump_history_version(current_period)
+        current_period.save()
+        
+        # Derived statistics are rebuilt once from the full history instead of per period
+        rebuild_cycle_features(user_id_hash)
+        invalidate_user_cache(user_id_hash)
+        queue_prediction_refresh(user_id_hash, current_period.history_version)
+        
+        response_body = {
+            'message': 'Period records imported successfully',
+            'imported_count': len(period_records),
+            'period_records': [
+                {
+                    'period_record_id': period_record.period_record_id,
+                    'current_status': period_record.current_status,
+                    'start_datetime': period_record.start_datetime,
+                    'end_datetime': period_record.end_datetime
+                }
+                for period_record in period_records
+            ]
+        }
+        
+        return response_body, 201
+
 
 class SymptomsRecordView(APIView):
     
@@ -184,6 +299,8 @@ class SymptomsRecordView(APIView):
         
         user_id_hash = request.user_obj.user_id_hash
         
+        # Passing `cursor` (empty for the first page) switches from page numbers to keyset pagination
+        cursor = request.query_params.get('cursor', None)
         page = int(request.query_params.get('page', 1))
         rows_per_page = int(request.query_params.get('rows_per_page', 10))
         symptom_occurence = int(request.query_params.get('symptom_occurence', 0))
@@ -210,7 +327,11 @@ class SymptomsRecordView(APIView):
             symptoms_records = symptoms_records.filter(symptom_occurence=SymptomsRecord.SymptomOccurence.NON_CYCLE_PHASE)
         
         # Paginate the symptoms records
-        symptoms_records=symptoms_records.order_by('-created_datetime')[(page-1)*rows_per_page:(page)*rows_per_page].values()
+        next_cursor = None
+        if cursor is not None:
+            symptoms_records, next_cursor = paginate_by_cursor(symptoms_records, 'created_datetime', 'symptom_id', cursor, rows_per_page)
+        else:
+            symptoms_records=symptoms_records.order_by('-created_datetime')[(page-1)*rows_per_page:(page)*rows_per_page].values()
         
         symptoms = [
             {
@@ -227,6 +348,8 @@ class SymptomsRecordView(APIView):
                 "message": "Symptoms records fetched successfully",
                 "symptoms": symptoms
         }
+        if cursor is not None:
+            response['next_cursor'] = next_cursor
 
         return response
     
@@ -235,41 +358,57 @@ class SymptomsRecordView(APIView):
         
         user_id_hash = request.user_obj.user_id_hash
         
-        serializer = CreateSymptomsRecordSerializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        # A `symptoms` array logs several symptoms at once, otherwise a single `symptom` is expected
+        batch = 'symptoms' in request.data
+        if batch:
+            serializer = CreateSymptomsRecordsSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            symptoms = serializer.get_value('symptoms')
+        else:
+            serializer = CreateSymptomsRecordSerializer(data=request.data)
+            serializer.is_valid(raise_exception=True)
+            symptoms = [serializer.validated_data]
         
-        symptom = serializer.get_value('symptom')
-        comments = serializer.get_value('comments', '')
+        # Resolved once for the whole batch
+        current_period_record_id = CurrentPeriod.objects.filter(user_id_hash=user_id_hash).values_list(
+            'current_period_record_id', flat=True
+        ).first()
         
-        current_period, created = CurrentPeriod.objects.get_or_create(
-            user_id_hash=user_id_hash,
-            defaults={
-                'current_period_record_id':None,
-                'last_period_record_id':None
-            })
+        symptom_occurence = SymptomsRecord.SymptomOccurence.NON_CYCLE_PHASE if current_period_record_id == None else SymptomsRecord.SymptomOccurence.DURING_PERIOD
         
-        symptom_occurence = SymptomsRecord.SymptomOccurence.NON_CYCLE_PHASE if current_period.current_period_record_id == None else SymptomsRecord.SymptomOccurence.DURING_PERIOD
+        symptom_records = [
+            SymptomsRecord(
+                user_id_hash=user_id_hash,
+                symptom=symptom['symptom'],
+                comments=symptom.get('comments', ''),
+                symptom_occurence=symptom_occurence,
+                period_record_id=current_period_record_id
+            )
+            for symptom in symptoms
+        ]
+        SymptomsRecord.objects.bulk_create(symptom_records)
         
-        symptom_record = SymptomsRecord.objects.create(
-            user_id_hash=user_id_hash,
-            symptom=symptom,
-            comments=comments,
-            symptom_occurence=symptom_occurence
-        )
+        symptoms = [
+            {
+                'symptom_id': symptom_record.symptom_id,
+                'symptom': symptom_record.symptom,
+                'comments': symptom_record.comments,
+                'symptom_occurence': symptom_record.symptom_occurence,
+                'period_record_id': symptom_record.period_record_id,
+                'created_datetime': symptom_record.created_datetime
+            }
+            for symptom_record in symptom_records
+        ]
         
-        if symptom_occurence == SymptomsRecord.SymptomOccurence.DURING_PERIOD:
-            symptom_record.period_record_id = current_period.current_period_record_id
-            symptom_record.save()
-            
-        response_body = {
-            'symptom_id': symptom_record.symptom_id,
-            'symptom': symptom_record.symptom,
-            'comments': symptom_record.comments,
-            'symptom_occurence': symptom_record.symptom_occurence,
-            'period_record_id': symptom_record.period_record_id ,
-            'created_datetime': symptom_record.created_datetime
-        }
+        if batch:
+            response_body = {
+                'symptom_ids': [symptom['symptom_id'] for symptom in symptoms],
+                'symptoms': symptoms,
+                'message': 'Symptoms records saved successfully'
+            }
+            return response_body, 201
         
+        response_body = symptoms[0]
         response_body['message'] = 'Symptoms record saved successfully'
         
         return response_body, 201
@@ -277,38 +416,91 @@ class SymptomsRecordView(APIView):
 
 class DashboardView(APIView):
 
+    @staticmethod
+    def build_cached_dashboard(user_id_hash, fresh=False):
+        """The parts of the dashboard that only change on writes, the day counts are derived from them per request"""
+        # CurrentPeriod, recent period records, features and prediction in one read
+        context = UserCycleContext.load(user_id_hash)
+        
+        last_period_record = context.last_period_record
+        prediction, prediction_age_seconds, _ = get_cycle_prediction(user_id_hash, fresh=fresh, context=context)
+        phase_snapshot = context.current_phase_snapshot
+        
+        return {
+            "has_current_period": context.current_period is not None,
+            "in_period": bool(context.current_period and context.current_period.current_period_record_id),
+            "last_period_start": last_period_record.start_datetime if last_period_record else None,
+            "avg_cycle_length": get_avg_cycle_length(user_id_hash, context=context),
+            "phase_offsets": get_phase_offsets(context.features),
+            "next_period_start": prediction['next_period_start'] if prediction else None,
+            "prediction_datetime": timezone.now() - timedelta(seconds=prediction_age_seconds),
+            "phase_snapshot": {
+                "snapshot_date": phase_snapshot.snapshot_date,
+                "phase": phase_snapshot.phase,
+                "cycle_day": phase_snapshot.cycle_day,
+                "days_until_next_phase": phase_snapshot.days_until_next_phase,
+            } if phase_snapshot else None,
+        }
+
     @forge
     def get(self, request):
         user_id_hash = request.user_obj.user_id_hash
         
-        current_period = CurrentPeriod.objects.filter(user_id_hash=user_id_hash).first()
-        last_period_record_id = current_period.last_period_record_id
-        last_period_record = PeriodRecord.objects.filter(period_record_id=last_period_record_id).first()
-        last_period_start = last_period_record.start_datetime if last_period_record else None
-
-        avg_cycle_length = get_avg_cycle_length(user_id_hash)
-        
-        phase, cycle_days = get_current_phase(user_id_hash)
-        
-        days_until_next_phase = get_days_until_next_phase(phase, cycle_days, avg_cycle_length)
+        fresh = request.query_params.get('fresh', '0') == '1'
+        if fresh:
+            dashboard = self.build_cached_dashboard(user_id_hash, fresh=True)
+        else:
+            dashboard = get_cached_payload(DASHBOARD, user_id_hash, lambda: self.build_cached_dashboard(user_id_hash))
+        
+        # Everything relative to today comes from today's nightly snapshot, or is recomputed when
+        # there is none, so a cached payload never goes stale overnight
+        now = timezone.now()
+        avg_cycle_length = dashboard['avg_cycle_length']
+        phase_snapshot = dashboard['phase_snapshot']
+        if phase_snapshot and phase_snapshot['snapshot_date'] == timezone.localdate(now):
+            phase = Phases(phase_snapshot['phase']) if phase_snapshot['phase'] is not None else "Unknown"
+            days_until_next_phase = phase_snapshot['days_until_next_phase']
+        else:
+            if not dashboard['has_current_period']:
+                phase, cycle_days = "Unknown", None
+            elif dashboard['in_period']:
+                phase, cycle_days = Phases.MENSTRUAL, None
+            else:
+                phase, cycle_days = get_phase_since_period_start(dashboard['last_period_start'], dashboard['phase_offsets'], now=now)
+            
+            days_until_next_phase = get_days_until_next_phase(phase, cycle_days, avg_cycle_length, dashboard['phase_offsets'])
         logger.info(f"Days until next phase: {days_until_next_phase}")
-        next_period_start = get_next_period_start_date(user_id_hash)
         
-        days_until_next_period = (next_period_start - timezone.now()).days if next_period_start else None
+        next_period_start = dashboard['next_period_start']
+        days_until_next_period = (next_period_start - now).days if next_period_start else None
 
         response = {
             "message": "Dashboard data fetched successfully",
-            "last_period_start": last_period_start,
+            "last_period_start": dashboard['last_period_start'],
             "avg_cycle_length": avg_cycle_length,
             "current_phase": phase,
             "next_period_start": next_period_start,
             "days_until_next_phase": days_until_next_phase,
-            "days_until_next_period": days_until_next_period
+            "days_until_next_period": days_until_next_period,
+            "prediction_age_seconds": int((now - dashboard['prediction_datetime']).total_seconds())
         }
         
         return response
     
 
+class DashboardCacheStatsView(APIView):
+    
+    @forge
+    def get(self, request):
+        if not request.user_obj.is_staff:
+            raise Forbidden('Cache stats are only available to staff')
+        
+        return {
+            "message": "Dashboard cache stats fetched successfully",
+            "cache_stats": get_cache_stats()
+        }
+    
+
 class DashboardDetailsView(APIView):
     
     @forge
@@ -339,33 +531,115 @@ class DashboardDetailsView(APIView):
         
 class CurrentStatusView(APIView):
     
-    @forge
-    def get(self, request):
-        
-        user_id_hash = request.user_obj.user_id_hash
-        
-        current_period = CurrentPeriod.objects.filter(user_id_hash=user_id_hash).first()
+    @staticmethod
+    def build_current_status(user_id_hash, fresh=False):
+        context = UserCycleContext.load(user_id_hash)
+        current_period = context.current_period
         
         if not current_period:
             raise BadRequest('Current period not found')
         
-        avg_cycle_length = get_avg_cycle_length(user_id_hash)
+        avg_cycle_length = get_avg_cycle_length(user_id_hash, context=context)
         
-        avg_period_length = get_avg_period_length(user_id_hash)
+        avg_period_length = get_avg_period_length(user_id_hash, context=context)
         
-        next_period_start = get_next_period_start_date(user_id_hash)
+        next_period_start = get_next_period_start_date(user_id_hash, fresh=fresh, context=context)
         
-        response = {
-            "message": "Current period status fetched successfully",
+        return {
             "current_period_record_id": current_period.current_period_record_id,
             "last_period_record_id": current_period.last_period_record_id,
             "avg_cycle_length": avg_cycle_length,
             "avg_period_length": avg_period_length,
-            "next_period_start": next_period_start
+            "next_period_start": next_period_start,
+            "cycle_statistics": context.cycle_statistics,
+            "cycle_regularity": get_cycle_regularity(context.features)
+        }
+    
+    @forge
+    def get(self, request):
+        
+        user_id_hash = request.user_obj.user_id_hash
+        
+        fresh = request.query_params.get('fresh', '0') == '1'
+        if fresh:
+            current_status = self.build_current_status(user_id_hash, fresh=True)
+        else:
+            current_status = get_cached_payload(CURRENT_STATUS, user_id_hash, lambda: self.build_current_status(user_id_hash))
+        
+        response = {
+            "message": "Current period status fetched successfully",
+            **current_status
+        }
+        
+        return response
+        
+    
+ 
+class CycleCalendarView(APIView):
+    
+    @forge
+    def get(self, request):
+        
+        user_id_hash = request.user_obj.user_id_hash
+        
+        # Dates as YYYY-MM-DD, by default the next 30 days
+        try:
+            start_date = request.query_params.get('start_date', None)
+            start_date = date.fromisoformat(start_date) if start_date else timezone.localdate()
+            end_date = request.query_params.get('end_date', None)
+            end_date = date.fromisoformat(end_date) if end_date else start_date + timedelta(days=30)
+        except ValueError:
+            raise BadRequest('Invalid date provided, expected YYYY-MM-DD')
+        
+        if end_date < start_date:
+            raise BadRequest('End date must not be before start date')
+        
+        if (end_date - start_date).days + 1 > MAX_CALENDAR_DAYS:
+            raise BadRequest(f'Calendar range cannot exceed {MAX_CALENDAR_DAYS} days')
+        
+        context = UserCycleContext.load(user_id_hash)
+        if not context.current_period:
+            raise BadRequest('Current period not found')
+        
+        response = {
+            "message": "Cycle calendar fetched successfully",
+            "start_date": start_date,
+            "end_date": end_date,
+            **get_cycle_calendar(user_id_hash, start_date, end_date, context=context)
         }
         
         return response
+    
+ 
+class CycleStatsView(APIView):
+    
+    DEFAULT_WINDOWS = '3,6,12'
+    MAX_WINDOWS = 10
+    
+    @forge
+    def get(self, request):
         
+        user_id_hash = request.user_obj.user_id_hash
+        
+        # Comma separated numbers of most recent cycles to average over
+        try:
+            windows = [int(window) for window in request.query_params.get('windows', self.DEFAULT_WINDOWS).split(',')]
+        except ValueError:
+            raise BadRequest('Invalid windows provided')
+        
+        if not windows or len(windows) > self.MAX_WINDOWS or any(window < 1 for window in windows):
+            raise BadRequest(f'Provide 1 to {self.MAX_WINDOWS} positive windows')
+        
+        features = get_cycle_features(user_id_hash)
+        
+        response = {
+            "message": "Cycle stats fetched successfully",
+            "cycle_count": features.cycle_length_count,
+            "period_count": features.period_duration_count,
+            "windows": get_windowed_stats(features, windows)
+        }
+        
+        return response
     
  
 class GetPhaseDetailsView(APIView):
@@ -0,0 +1,41 @@
+# Gunicorn configuration, used by start_server.sh and the Dockerfile
+import os
+
+from utils.memory import format_memory_usage, get_memory_usage
+
+# Read while gunicorn loads this file, before the arbiter imports a preloaded app. on_starting
+# runs only after the preload, so it cannot take the "before" reading itself.
+MEMORY_BEFORE_APP = get_memory_usage()
+
+# Import the Django app (and warm the prediction model through PredictionsConfig.ready) once in
+# the master, so every forked worker shares the model's pages instead of loading its own copy.
+# Not with the keras backend: JAX starts runtime threads and holds XLA state when the model is
+# loaded, neither survives a fork, so every worker has to load the model itself.
+preload_app = os.getenv('PREDICTION_BACKEND', 'numpy') != 'keras'
+
+
+def on_starting(server):
+    server.log.info(f"Master memory before loading the app: {format_memory_usage(MEMORY_BEFORE_APP)}")
+
+
+def when_ready(server):
+    if not server.cfg.preload_app:
+        server.log.info("App not preloaded (PREDICTION_BACKEND=keras), every worker loads the prediction model itself")
+        return
+    
+    from predictions.registry import model_registry
+    
+    server.log.info(f"Master memory after loading the app: {format_memory_usage(get_memory_usage())}")
+    server.log.info(f"Prediction model preloaded: {model_registry.stats()}")
+
+
+def post_fork(server, worker):
+    server.log.info(f"Worker {worker.pid} forked: {format_memory_usage(get_memory_usage())}")
+
+
+def post_worker_init(worker):
+    worker.log.info(f"Worker {worker.pid} ready: {format_memory_usage(get_memory_usage())}")
+
+
+def worker_exit(server, worker):
+    server.log.info(f"Worker {worker.pid} exiting: {format_memory_usage(get_memory_usage())}")
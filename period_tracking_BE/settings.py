@@ -31,6 +31,21 @@ CELERY_BROKER_URL = os_getenv('CELERY_BROKER_URL')
 
 GEMINI_API_KEY = os_getenv('GEMINI_API_KEY')
 
+# CYCLE STATISTICS SETTINGS
+# 'mongo' computes statistics with an aggregation pipeline (MongoDB 5.0+), 'python' in the app
+CYCLE_STATS_BACKEND = os_getenv('CYCLE_STATS_BACKEND', 'mongo')
+# Upper bound on how long a cached dashboard/current-status payload lives, writes invalidate it right away
+CYCLE_PAYLOAD_CACHE_SECONDS = int(os_getenv('CYCLE_PAYLOAD_CACHE_SECONDS', str(60 * 60 * 24)))
+
+# PREDICTION SETTINGS
+PREDICTION_MODEL_WARMUP = os_getenv('PREDICTION_MODEL_WARMUP', 'True') == 'True'
+# 'numpy' serves from the exported weights artifact, 'keras' loads the original model
+PREDICTION_BACKEND = os_getenv('PREDICTION_BACKEND', 'numpy')
+PREDICTION_BATCH_WINDOW_MS = int(os_getenv('PREDICTION_BATCH_WINDOW_MS', '5'))
+PREDICTION_BATCH_MAX_SIZE = int(os_getenv('PREDICTION_BATCH_MAX_SIZE', '32'))
+PREDICTION_REFRESH_DEBOUNCE_SECONDS = int(os_getenv('PREDICTION_REFRESH_DEBOUNCE_SECONDS', '30'))
+PREDICTION_REFRESH_LOCK_SECONDS = int(os_getenv('PREDICTION_REFRESH_LOCK_SECONDS', '300'))
+
 
 #################################################################
 ##################### DATABASE CONFIGURATION ####################
@@ -47,6 +62,19 @@ DATABASES = {
     }
 }
 
+#################################################################
+####################### CACHE CONFIGURATION #####################
+#################################################################
+# Cached payloads and their data versions have to be visible to every web and Celery process, so the
+# payload cache only turns on with a shared backend, e.g. CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# and CACHE_LOCATION=redis://redis:6379/1. The per-process default keeps it off.
+CACHES = {
+    'default': {
+        'BACKEND': os_getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os_getenv('CACHE_LOCATION', 'period-tracking'),
+    }
+}
+
 #################################################################
 ##################### INSTALLED APPLICATIONS ####################
 #################################################################
@@ -226,6 +254,8 @@ LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'Asia/Kolkata'
 USE_I18N = True
 USE_TZ = True
+# Beat crontabs are in local time, the nightly jobs are scheduled around the users' midnight
+CELERY_TIMEZONE = TIME_ZONE
 
 #################################################################
 ##################### ALLOWED ENDPOINTS #########################
@@ -240,6 +270,18 @@ SKIP_AUTH_PATTERNS = [
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 
+#################################################################
+#################### PREDICTION MODEL FILES #####################
+#################################################################
+PREDICTION_MODEL_DIR = os.path.join(BASE_DIR, 'models')
+PREDICTION_MODEL_PATH = os.path.join(PREDICTION_MODEL_DIR, 'lstm_combined_model.keras')
+PREDICTION_FEATURE_SCALER_PATH = os.path.join(PREDICTION_MODEL_DIR, 'feature_scaler.pkl')
+PREDICTION_LABEL_SCALER_PATH = os.path.join(PREDICTION_MODEL_DIR, 'label_scaler.pkl')
+# Generated from the files above with `python manage.py export_prediction_weights`
+PREDICTION_WEIGHTS_PATH = os.path.join(PREDICTION_MODEL_DIR, 'lstm_combined_weights.npz')
+# Persistent XLA compilation cache for the keras/JAX backend, mount it as a volume to reuse across deploys
+PREDICTION_JAX_CACHE_DIR = os_getenv('PREDICTION_JAX_CACHE_DIR', os.path.join(BASE_DIR, '.jax_cache'))
+
 #################################################################
 ####################### MISCELLANEOUS ##########################
 #################################################################
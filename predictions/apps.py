@@ -1,6 +1,30 @@
+import sys
+from logging import getLogger
+
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = getLogger(__name__)
+
+# manage.py commands that never serve predictions and should not pay for the model load
+SKIP_WARMUP_COMMANDS = ('makemigrations', 'migrate', 'collectstatic', 'shell', 'check', 'test')
 
 
 class PredictionsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'predictions'
+
+    def ready(self):
+        if not settings.PREDICTION_MODEL_WARMUP:
+            return
+
+        if len(sys.argv) > 1 and sys.argv[1] in SKIP_WARMUP_COMMANDS:
+            return
+
+        from predictions.registry import model_registry
+
+        try:
+            model_registry.warm()
+        except Exception as e:
+            # Startup must not fail because of the model, requests will retry the load lazily
+            logger.error(f"Error warming prediction model: {e}")
@@ -0,0 +1,112 @@
+import os
+import queue
+import threading
+from time import monotonic
+from concurrent.futures import Future
+from logging import getLogger
+
+import numpy as np
+
+logger = getLogger(__name__)
+
+
+class PredictionBatcher:
+    """
+    Collects concurrent prediction requests for a short window and runs them as one batch.
+
+    Every caller submits a single model input row and blocks until its own output row
+    comes back. A background thread drains the queue and, when rows are arriving
+    concurrently, waits at most `window_ms` for more (or until `max_batch_size` rows are
+    collected), stacks them and calls `predict_fn` once for the whole batch.
+    """
+
+    def __init__(self, predict_fn, window_ms=5, max_batch_size=32, timeout_seconds=30):
+        self.predict_fn = predict_fn
+        self.window_seconds = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.timeout_seconds = timeout_seconds
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+        self.batches_run = 0
+        self.rows_predicted = 0
+
+    def submit(self, input_row):
+        """Queue one input row and wait for its prediction row."""
+        if self.max_batch_size <= 1:
+            return self.predict_fn(np.expand_dims(input_row, axis=0))[0]
+
+        self._ensure_worker()
+
+        future = Future()
+        self._queue.put((input_row, future))
+        return future.result(timeout=self.timeout_seconds)
+
+    def _ensure_worker(self):
+        # Threads do not survive a fork, so a forked worker process starts its own
+        if self._worker is not None and self._worker.is_alive() and self._worker_pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._worker is not None and self._worker.is_alive() and self._worker_pid == os.getpid():
+                return
+
+            if self._worker_pid != os.getpid():
+                self._queue = queue.Queue()
+
+            self._worker = threading.Thread(target=self._run, name='prediction-batcher', daemon=True)
+            self._worker_pid = os.getpid()
+            self._worker.start()
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = monotonic() + self.window_seconds
+
+        while len(batch) < self.max_batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+                continue
+            except queue.Empty:
+                pass
+
+            # A lone row (one request thread per process, a Celery task) is predicted at once,
+            # the window is only waited out while other rows are arriving concurrently
+            remaining = deadline - monotonic()
+            if len(batch) == 1 or remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+
+            # Anything raised here fails this batch's callers only, the thread has to keep serving the queue
+            try:
+                inputs = np.stack([input_row for input_row, _ in batch])
+                outputs = self.predict_fn(inputs)
+            except Exception as e:
+                logger.error(f"Error running prediction batch of {len(batch)}: {e}")
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            self.batches_run += 1
+            self.rows_predicted += len(batch)
+
+            for (_, future), output_row in zip(batch, outputs):
+                future.set_result(output_row)
+
+    def stats(self):
+        return {
+            'batches_run': self.batches_run,
+            'rows_predicted': self.rows_predicted,
+            'avg_batch_size': self.rows_predicted / self.batches_run if self.batches_run else None,
+        }
@@ -0,0 +1,54 @@
+import os
+import pickle
+
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from predictions.numpy_model import export_keras_model, load_numpy_artifact
+
+
+class Command(BaseCommand):
+    help = 'Export the keras prediction model and scalers to the NumPy weights artifact and verify it against keras'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.PREDICTION_WEIGHTS_PATH, help='Path of the .npz artifact to write')
+        parser.add_argument('--samples', type=int, default=1000, help='Number of random inputs to compare against keras')
+        parser.add_argument('--tolerance', type=float, default=1e-4, help='Maximum allowed absolute difference in days')
+
+    def handle(self, *args, **options):
+        # Keras is only needed here, the web workers serve from the exported artifact
+        os.environ["KERAS_BACKEND"] = "jax"
+        import keras
+
+        model = keras.saving.load_model(settings.PREDICTION_MODEL_PATH)
+        with open(settings.PREDICTION_FEATURE_SCALER_PATH, 'rb') as f:
+            feature_scaler = pickle.load(f)
+        with open(settings.PREDICTION_LABEL_SCALER_PATH, 'rb') as f:
+            label_scaler = pickle.load(f)
+
+        export_keras_model(model, feature_scaler, label_scaler, options['output'])
+        numpy_model, numpy_feature_scaler, numpy_label_scaler = load_numpy_artifact(options['output'])
+
+        # Realistic cycle lengths/durations plus the scaled range the model was trained on
+        rng = np.random.default_rng(0)
+        cycles = np.stack([
+            rng.integers(15, 60, size=(options['samples'], 3)),
+            rng.integers(1, 12, size=(options['samples'], 3)),
+        ], axis=-1).astype(np.float64)
+        scaled = feature_scaler.transform(cycles.reshape(-1, 2)).reshape(-1, 3, 2)
+
+        keras_output = label_scaler.inverse_transform(model.predict(scaled, verbose=0))
+        numpy_scaled = numpy_feature_scaler.transform(cycles.reshape(-1, 2)).reshape(-1, 3, 2)
+        numpy_output = numpy_label_scaler.inverse_transform(numpy_model.predict(numpy_scaled))
+
+        max_difference = float(np.max(np.abs(keras_output - numpy_output)))
+        if max_difference > options['tolerance']:
+            raise CommandError(f'NumPy model differs from keras by {max_difference} (tolerance {options["tolerance"]})')
+
+        mismatched = int(np.sum(np.round(keras_output) != np.round(numpy_output)))
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Exported weights to {options["output"]}, max difference over {options["samples"]} inputs: '
+            f'{max_difference:.2e}, rounded predictions differing: {mismatched}'
+        ))
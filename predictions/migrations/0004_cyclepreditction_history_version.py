@@ -0,0 +1,18 @@
+# Generated by Django 4.1.13 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0003_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cyclepreditction',
+            name='history_version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
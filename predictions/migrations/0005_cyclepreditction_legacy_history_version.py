@@ -0,0 +1,26 @@
+# Generated by Django 4.1.13 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+def mark_legacy_predictions(apps, schema_editor):
+    # Predictions stored before versioning got the default 0, which matches every user's initial
+    # history version, so they would never be refreshed. Mark them unversioned instead.
+    CyclePreditction = apps.get_model('predictions', 'CyclePreditction')
+    CyclePreditction.objects.all().update(history_version=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0004_cyclepreditction_history_version'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cyclepreditction',
+            name='history_version',
+            field=models.IntegerField(blank=True, default=None, null=True),
+        ),
+        migrations.RunPython(mark_legacy_predictions, migrations.RunPython.noop),
+    ]
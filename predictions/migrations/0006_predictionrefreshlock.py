@@ -0,0 +1,24 @@
+# Generated by Django 4.1.13 on 2026-10-18 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('predictions', '0005_cyclepreditction_legacy_history_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PredictionRefreshLock',
+            fields=[
+                ('user_id_hash', models.CharField(editable=False, max_length=200, primary_key=True, serialize=False)),
+                ('history_version', models.IntegerField()),
+                ('locked_until', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'db_table': 'prediction_refresh_lock',
+            },
+        ),
+    ]
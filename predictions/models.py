@@ -1,16 +1,46 @@
 from uuid import uuid4
+from typing import ClassVar
 from djongo import models
 
 
 class CyclePreditction(models.Model):
+    # Declarative MongoDB indexes, created and reconciled by `manage.py sync_indexes`
+    MONGO_INDEXES: ClassVar[list] = [
+        {'name': 'user_id_hash', 'keys': [('user_id_hash', 1)], 'unique': True},
+    ]
+    
     user_id_hash = models.CharField(max_length=200, primary_key=True, editable=False)
     cycle_length = models.IntegerField()
     period_duration = models.IntegerField()
     next_period_start = models.DateTimeField()
     next_period_end = models.DateTimeField()
     days_until_next_period = models.IntegerField()
+    # CurrentPeriod.history_version the prediction was generated from, None for predictions
+    # stored before versioning, which never match and are refreshed on the next read
+    history_version = models.IntegerField(null=True, blank=True, default=None)
     update_datetime = models.DateTimeField(auto_now=True)
 
 
+class PredictionRefreshLock(models.Model):
+    """
+    Single-flight lock of the background prediction refresh, one document per user.
+    
+    Lives in MongoDB so every web worker and the Celery worker see the same lock, taken and
+    released with conditional updates by predictions.utils.acquire_refresh_lock / release_refresh_lock.
+    """
+    class Meta:
+        db_table = 'prediction_refresh_lock'
+    
+    MONGO_INDEXES: ClassVar[list] = [
+        {'name': 'user_id_hash', 'keys': [('user_id_hash', 1)], 'unique': True},
+    ]
+    
+    user_id_hash = models.CharField(max_length=200, primary_key=True, editable=False)
+    # History version the queued refresh is for
+    history_version = models.IntegerField()
+    # None once released, an expired lock counts as released in case the task never ran
+    locked_until = models.DateTimeField(null=True, blank=True)
+
+
 
     
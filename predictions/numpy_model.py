@@ -0,0 +1,136 @@
+import numpy as np
+
+
+ACTIVATIONS = {
+    'linear': lambda x: x,
+    'relu': lambda x: np.maximum(x, 0),
+    'tanh': np.tanh,
+    'sigmoid': lambda x: 1 / (1 + np.exp(-x)),
+}
+
+
+class NumpyMinMaxScaler:
+    """Drop-in replacement for the fitted sklearn MinMaxScaler, only the parts used at inference"""
+
+    def __init__(self, scale, min_):
+        self.scale_ = np.asarray(scale, dtype=np.float64)
+        self.min_ = np.asarray(min_, dtype=np.float64)
+
+    def transform(self, values):
+        return np.asarray(values, dtype=np.float64) * self.scale_ + self.min_
+
+    def inverse_transform(self, values):
+        return (np.asarray(values, dtype=np.float64) - self.min_) / self.scale_
+
+
+class NumpyLSTMModel:
+    """
+    Forward pass of the LSTM -> Dense -> Dense model in plain NumPy.
+
+    Mirrors keras' LSTM cell (gate order i, f, c, o) and runs the whole batch in one
+    vectorized pass per time step, so serving predictions needs no deep-learning runtime.
+    """
+
+    def __init__(self, lstm_kernel, lstm_recurrent_kernel, lstm_bias, dense_layers,
+                 lstm_activation='tanh', lstm_recurrent_activation='sigmoid'):
+        self.lstm_kernel = lstm_kernel
+        self.lstm_recurrent_kernel = lstm_recurrent_kernel
+        self.lstm_bias = lstm_bias
+        self.units = lstm_recurrent_kernel.shape[0]
+        self.activation = ACTIVATIONS[lstm_activation]
+        self.recurrent_activation = ACTIVATIONS[lstm_recurrent_activation]
+        # List of (kernel, bias, activation name) tuples applied after the LSTM
+        self.dense_layers = [(kernel, bias, ACTIVATIONS[activation]) for kernel, bias, activation in dense_layers]
+
+    def predict(self, inputs, batch_size=None, verbose=0):
+        """
+        Same call signature as keras' Model.predict for a (batch, timesteps, features) array
+
+        Runs in one pass unless `batch_size` is given, then in passes of at most `batch_size`
+        rows like keras does.
+        """
+        inputs = np.asarray(inputs, dtype=self.lstm_kernel.dtype)
+
+        if batch_size is None or batch_size >= len(inputs):
+            return self._forward(inputs)
+
+        return np.concatenate([self._forward(inputs[start:start + batch_size]) for start in range(0, len(inputs), batch_size)])
+
+    def _forward(self, inputs):
+        rows, timesteps, _ = inputs.shape
+
+        hidden = np.zeros((rows, self.units), dtype=inputs.dtype)
+        cell = np.zeros((rows, self.units), dtype=inputs.dtype)
+
+        # Input projection for every time step at once, only the recurrent part is sequential
+        projected = inputs @ self.lstm_kernel + self.lstm_bias
+
+        for step in range(timesteps):
+            gates = projected[:, step, :] + hidden @ self.lstm_recurrent_kernel
+            input_gate, forget_gate, candidate, output_gate = np.split(gates, 4, axis=1)
+
+            cell = self.recurrent_activation(forget_gate) * cell + self.recurrent_activation(input_gate) * self.activation(candidate)
+            hidden = self.recurrent_activation(output_gate) * self.activation(cell)
+
+        outputs = hidden
+        for kernel, bias, activation in self.dense_layers:
+            outputs = activation(outputs @ kernel + bias)
+
+        return outputs
+
+
+def export_keras_model(model, feature_scaler, label_scaler, weights_path):
+    """Write the keras model weights and scaler parameters to a single .npz artifact"""
+    lstm, *dense_layers = [layer for layer in model.layers if layer.weights]
+    lstm_kernel, lstm_recurrent_kernel, lstm_bias = lstm.get_weights()
+    lstm_config = lstm.get_config()
+
+    arrays = {
+        'lstm_kernel': lstm_kernel,
+        'lstm_recurrent_kernel': lstm_recurrent_kernel,
+        'lstm_bias': lstm_bias,
+        'lstm_activations': np.array([lstm_config['activation'], lstm_config['recurrent_activation']]),
+        'dense_activations': np.array([layer.get_config()['activation'] for layer in dense_layers]),
+        'feature_scaler_scale': feature_scaler.scale_,
+        'feature_scaler_min': feature_scaler.min_,
+        'label_scaler_scale': label_scaler.scale_,
+        'label_scaler_min': label_scaler.min_,
+    }
+    for index, layer in enumerate(dense_layers):
+        kernel, bias = layer.get_weights()
+        arrays[f'dense_{index}_kernel'] = kernel
+        arrays[f'dense_{index}_bias'] = bias
+
+    np.savez(weights_path, **arrays)
+
+
+def load_numpy_artifact(weights_path):
+    """
+    Load the exported artifact
+
+    Returns:
+        model, feature_scaler, label_scaler
+    """
+    with np.load(weights_path, allow_pickle=False) as artifact:
+        lstm_activation, lstm_recurrent_activation = [str(name) for name in artifact['lstm_activations']]
+        dense_layers = [
+            (artifact[f'dense_{index}_kernel'], artifact[f'dense_{index}_bias'], str(activation))
+            for index, activation in enumerate(artifact['dense_activations'])
+        ]
+
+        model = NumpyLSTMModel(
+            lstm_kernel=artifact['lstm_kernel'],
+            lstm_recurrent_kernel=artifact['lstm_recurrent_kernel'],
+            lstm_bias=artifact['lstm_bias'],
+            dense_layers=dense_layers,
+            lstm_activation=lstm_activation,
+            lstm_recurrent_activation=lstm_recurrent_activation,
+        )
+        feature_scaler = NumpyMinMaxScaler(artifact['feature_scaler_scale'], artifact['feature_scaler_min'])
+        label_scaler = NumpyMinMaxScaler(artifact['label_scaler_scale'], artifact['label_scaler_min'])
+
+    # Weights loaded in the gunicorn master are shared copy-on-write with the workers, keep them read-only
+    for array in [model.lstm_kernel, model.lstm_recurrent_kernel, model.lstm_bias, *[weight for layer in model.dense_layers for weight in layer[:2]]]:
+        array.setflags(write=False)
+
+    return model, feature_scaler, label_scaler
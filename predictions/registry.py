@@ -0,0 +1,102 @@
+import threading
+from time import perf_counter
+from logging import getLogger
+
+from django.conf import settings
+
+logger = getLogger(__name__)
+
+
+class ModelRegistry:
+    """
+    Process-wide holder for the prediction service.
+
+    The model and both scalers are loaded at most once per process and the
+    same ready-to-use PeriodPredictionService is handed to every caller.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._service = None
+        self._load_time_seconds = None
+        self._warmup_seconds = None
+        self._loads = 0
+        self._hits = 0
+        self._misses = 0
+
+    def get_service(self):
+        """Return the shared PeriodPredictionService, loading it on first use."""
+        service = self._service
+        if service is not None:
+            self._hits += 1
+            return service
+
+        with self._lock:
+            # Another thread may have finished loading while we waited for the lock
+            if self._service is not None:
+                self._hits += 1
+                return self._service
+
+            self._misses += 1
+            self._service = self._load()
+            return self._service
+
+    def warm(self):
+        """Load the service ahead of the first request. Safe to call more than once."""
+        if self._service is None:
+            self.get_service()
+        return self._service
+
+    def reset(self):
+        """Drop the loaded service so the next call reloads it from disk."""
+        with self._lock:
+            self._service = None
+
+    def is_loaded(self):
+        return self._service is not None
+
+    def stats(self):
+        """Load-time, hit and batching metrics for this process."""
+        return {
+            'loaded': self.is_loaded(),
+            'backend': self._service.backend if self._service is not None else None,
+            'loads': self._loads,
+            'load_time_seconds': self._load_time_seconds,
+            'warmup_seconds': self._warmup_seconds,
+            'hits': self._hits,
+            'misses': self._misses,
+            'batching': self._service.batcher.stats() if self._service is not None else None,
+        }
+
+    def _load(self):
+        # Imported here so that importing the registry never pulls in the model runtime
+        from predictions.utils import PeriodPredictionService
+
+        started = perf_counter()
+        service = PeriodPredictionService(
+            model_path=settings.PREDICTION_MODEL_PATH,
+            feature_scaler_path=settings.PREDICTION_FEATURE_SCALER_PATH,
+            label_scaler_path=settings.PREDICTION_LABEL_SCALER_PATH,
+            weights_path=settings.PREDICTION_WEIGHTS_PATH,
+            backend=settings.PREDICTION_BACKEND,
+            batch_window_ms=settings.PREDICTION_BATCH_WINDOW_MS,
+            max_batch_size=settings.PREDICTION_BATCH_MAX_SIZE,
+            jax_cache_dir=settings.PREDICTION_JAX_CACHE_DIR,
+        )
+        self._load_time_seconds = perf_counter() - started
+        self._loads += 1
+
+        logger.info(f"Prediction model ({service.backend}) loaded in {self._load_time_seconds:.3f}s")
+
+        self._warmup_seconds = service.warmup()
+        logger.info(f"Prediction model compiled for batch sizes {service.warmup_batch_sizes()} in {self._warmup_seconds:.3f}s")
+
+        return service
+
+
+model_registry = ModelRegistry()
+
+
+def get_prediction_service():
+    """Shortcut used by views and helpers to get the shared prediction service."""
+    return model_registry.get_service()
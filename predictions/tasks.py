@@ -0,0 +1,135 @@
+from collections import deque
+from itertools import groupby
+from time import perf_counter
+from logging import getLogger
+
+import numpy as np
+from celery import shared_task
+from django.utils import timezone
+
+from cycles.cache import invalidate_user_cache
+from cycles.history import to_epoch_day
+from cycles.models import CurrentPeriod, PeriodRecord
+from predictions.models import CyclePreditction
+from predictions.registry import get_prediction_service
+from predictions.utils import build_cycles_batch, generate_cycle_prediction, get_history_version, release_refresh_lock
+from utils.helpers import bulk_upsert
+
+logger = getLogger(__name__)
+
+# Periods needed to build the 3 cycles the model takes as input
+REQUIRED_PERIODS = 4
+
+
+def _upsert_predictions(predictions, history_versions):
+    """Write a chunk of predictions with one bulk upsert"""
+    now = timezone.now()
+    bulk_upsert(CyclePreditction, [
+        CyclePreditction(
+            user_id_hash=user_id_hash,
+            update_datetime=now,
+            history_version=history_versions.get(user_id_hash) or 0,
+            **prediction
+        )
+        for user_id_hash, prediction in predictions.items()
+    ])
+    if predictions:
+        invalidate_user_cache(*predictions.keys())
+
+
+def _process_chunk(service, user_periods):
+    """
+    Predict and store a chunk of {user_id_hash: [last 4 (start, end)]}
+    
+    Users whose stored prediction already matches their history version are skipped.
+    Returns the number of users that were predicted.
+    """
+    user_id_hashes = list(user_periods.keys())
+    history_versions = dict(CurrentPeriod.objects.filter(user_id_hash__in=user_id_hashes).values_list('user_id_hash', 'history_version'))
+    stored_versions = dict(CyclePreditction.objects.filter(user_id_hash__in=user_id_hashes).values_list('user_id_hash', 'history_version'))
+    
+    stale_periods = {
+        user_id_hash: periods for user_id_hash, periods in user_periods.items()
+        if stored_versions.get(user_id_hash) != (history_versions.get(user_id_hash) or 0)
+    }
+    if not stale_periods:
+        return 0
+    
+    _upsert_predictions(_predict_chunk(service, stale_periods), history_versions)
+    return len(stale_periods)
+
+
+def _predict_chunk(service, user_periods):
+    """Run one batched inference for a chunk of {user_id_hash: [last 4 (start, end)]}"""
+    user_id_hashes = list(user_periods.keys())
+    start_days = np.array([[to_epoch_day(start) for start, _ in periods] for periods in user_periods.values()], dtype=np.int32)
+    end_days = np.array([[to_epoch_day(end) for _, end in periods] for periods in user_periods.values()], dtype=np.int32)
+    
+    raw_predictions = service.predict_batch(build_cycles_batch(start_days, end_days))
+    
+    return {
+        user_id_hash: service.build_prediction(raw_prediction, user_periods[user_id_hash][-1][0])
+        for user_id_hash, raw_prediction in zip(user_id_hashes, raw_predictions)
+    }
+
+
+@shared_task
+def precompute_cycle_predictions(chunk_size=500):
+    """
+    Refresh CyclePreditction for every user with enough completed periods
+    
+    Completed period records are streamed ordered by user, so only the last 4 periods of
+    `chunk_size` users are held in memory at a time. Each chunk is predicted in one batch
+    and written back with bulk writes. Predictions already made from the user's current
+    history version are left alone.
+    """
+    started = perf_counter()
+    service = get_prediction_service()
+    
+    period_records = PeriodRecord.objects.filter(
+        current_status=PeriodRecord.CurrentStatus.COMPLETED.value
+    ).order_by('user_id_hash', 'start_datetime').values_list('user_id_hash', 'start_datetime', 'end_datetime')
+    
+    users_processed = 0
+    users_predicted = 0
+    chunk = {}
+    
+    for user_id_hash, records in groupby(period_records.iterator(chunk_size=chunk_size * REQUIRED_PERIODS), key=lambda record: record[0]):
+        last_periods = deque(((start, end) for _, start, end in records), maxlen=REQUIRED_PERIODS)
+        if len(last_periods) < REQUIRED_PERIODS:
+            continue
+        
+        chunk[user_id_hash] = list(last_periods)
+        if len(chunk) >= chunk_size:
+            users_predicted += _process_chunk(service, chunk)
+            users_processed += len(chunk)
+            chunk = {}
+    
+    if chunk:
+        users_predicted += _process_chunk(service, chunk)
+        users_processed += len(chunk)
+    
+    wall_time = perf_counter() - started
+    users_per_second = users_processed / wall_time if wall_time else 0
+    
+    logger.info(f"Precomputed predictions for {users_processed} users ({users_predicted} stale) in {wall_time:.2f}s ({users_per_second:.1f} users/s)")
+    
+    return {
+        'users_processed': users_processed,
+        'users_predicted': users_predicted,
+        'wall_time_seconds': wall_time,
+        'users_per_second': users_per_second
+    }
+
+
+@shared_task
+def refresh_cycle_prediction(user_id_hash, history_version):
+    """Recompute one user's prediction, unless a newer history version has been queued since"""
+    try:
+        if get_history_version(user_id_hash) != history_version:
+            logger.info(f"Skipping prediction refresh for {user_id_hash}, version {history_version} is outdated")
+            return
+        
+        generate_cycle_prediction(user_id_hash, history_version)
+    finally:
+        release_refresh_lock(user_id_hash, history_version)
@@ -0,0 +1,62 @@
+from datetime import datetime
+from time import monotonic
+from unittest import mock
+
+import numpy as np
+from django.db import connection
+from django.test import SimpleTestCase
+from django.utils import timezone
+from pymongo import UpdateOne
+
+from predictions.batching import PredictionBatcher
+from predictions.models import CyclePreditction
+from utils.helpers import bulk_upsert
+
+
+class BulkUpsertTests(SimpleTestCase):
+    """The write path of precompute_cycle_predictions, bulk_update's SQL is not supported by djongo"""
+
+    def test_one_upserting_bulk_write_per_chunk(self):
+        next_period_start = timezone.make_aware(datetime(2026, 11, 2, 9, 30))
+        predictions = [
+            CyclePreditction(
+                user_id_hash=user_id_hash,
+                cycle_length=28,
+                period_duration=5,
+                next_period_start=next_period_start,
+                next_period_end=next_period_start,
+                days_until_next_period=14,
+                history_version=history_version,
+            )
+            for user_id_hash, history_version in (('stored', 3), ('new', 0))
+        ]
+
+        database = mock.MagicMock()
+        with mock.patch.object(connection, 'ensure_connection'), mock.patch.object(connection, 'connection', database):
+            bulk_upsert(CyclePreditction, predictions)
+
+        collection = database[CyclePreditction._meta.db_table]
+        (operations,), _ = collection.bulk_write.call_args
+        self.assertEqual(len(operations), 2)
+        self.assertTrue(all(isinstance(operation, UpdateOne) for operation in operations))
+
+        stored = operations[0]._doc['$set']
+        self.assertEqual(operations[0]._filter, {'user_id_hash': 'stored'})
+        self.assertTrue(operations[0]._upsert)
+        self.assertEqual(stored['history_version'], 3)
+        self.assertEqual(operations[1]._doc['$set']['history_version'], 0)
+        # Stored like djongo stores datetimes, naive UTC
+        self.assertEqual(stored['next_period_start'], datetime(2026, 11, 2, 4, 0))
+        self.assertTrue(timezone.is_naive(stored['update_datetime']))
+
+
+class PredictionBatcherTests(SimpleTestCase):
+
+    def test_lone_row_does_not_wait_for_the_window(self):
+        batcher = PredictionBatcher(lambda inputs: inputs * 2, window_ms=2000)
+
+        started = monotonic()
+        output = batcher.submit(np.ones((3, 2)))
+
+        self.assertLess(monotonic() - started, 1)
+        self.assertEqual(output.tolist(), [[2, 2]] * 3)
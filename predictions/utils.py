@@ -1,32 +1,83 @@
 import pickle
 import numpy as np
-from datetime import datetime, timedelta
+from datetime import timedelta
+from django.conf import settings
+from django.db import connection
 from django.utils import timezone
+from pymongo.errors import DuplicateKeyError
 from logging import getLogger
+from time import perf_counter
 
-from cycles.models import PeriodRecord
-from predictions.models import CyclePreditction
+from cycles.cache import invalidate_user_cache
+from cycles.features import DEFAULT_CYCLE_LENGTH, get_cycle_features, get_model_input
+from cycles.history import CycleHistory
+from cycles.models import CurrentPeriod, PhaseDuration
+from predictions.batching import PredictionBatcher
+from predictions.models import CyclePreditction, PredictionRefreshLock
+from predictions.numpy_model import load_numpy_artifact
+from predictions.registry import get_prediction_service
 
 logger = getLogger(__name__)
 
+def build_prediction_details(cycle_length, period_duration, last_period_date):
+    """Sanitize a predicted cycle length and period duration and turn them into the prediction details dict"""
+    # Sanitize prediction
+    next_cycle_length = max(min(round(cycle_length), 45), 21)
+    next_period_duration = max(min(round(period_duration), 10), 2)
+    
+    # Calculate next period dates
+    next_period_start = last_period_date + timedelta(days=next_cycle_length)
+    next_period_end = next_period_start + timedelta(days=next_period_duration)
+    
+    return {
+        'cycle_length': next_cycle_length,
+        'period_duration': next_period_duration,
+        'next_period_start': next_period_start,
+        'next_period_end': next_period_end,
+        'days_until_next_period': (next_period_start - timezone.now()).days
+    }
+
+
 class PeriodPredictionService:
     """Service to load the model and make predictions for users"""
     
     def __init__(self, model_path="./models/lstm_combined_model.keras", 
                 feature_scaler_path="./models/feature_scaler.pkl", 
-                label_scaler_path="./models/label_scaler.pkl"):
+                label_scaler_path="./models/label_scaler.pkl",
+                weights_path="./models/lstm_combined_weights.npz",
+                backend="numpy",
+                batch_window_ms=5, max_batch_size=32,
+                jax_cache_dir=None):
         """Load the model and scalers"""
-        # Load the model
-        # self.model = tf.keras.models.load_model(model_path)
+        self.backend = backend
+        self.max_batch_size = max_batch_size
         
+        if backend == "numpy":
+            # Exported weights and scaler parameters, served without keras or sklearn
+            self.model, self.feature_scaler, self.label_scaler = load_numpy_artifact(weights_path)
+        else:
+            self._load_keras(model_path, feature_scaler_path, label_scaler_path, jax_cache_dir)
+        
+        # Concurrent single-user predictions are grouped into one model call
+        self.batcher = PredictionBatcher(self.predict_batch, window_ms=batch_window_ms, max_batch_size=max_batch_size)
+    
+    def _load_keras(self, model_path, feature_scaler_path, label_scaler_path, jax_cache_dir=None):
+        """Load the original keras model and pickled sklearn scalers"""
         # Available backend options are: "jax", "torch", "tensorflow".
         import os
         os.environ["KERAS_BACKEND"] = "jax"
+        
+        if jax_cache_dir:
+            # Compiled XLA programs are reused across restarts instead of being traced again
+            import jax
+            os.makedirs(jax_cache_dir, exist_ok=True)
+            jax.config.update("jax_compilation_cache_dir", jax_cache_dir)
+            jax.config.update("jax_persistent_cache_min_compile_time_secs", 0)
+            jax.config.update("jax_persistent_cache_min_entry_size_bytes", -1)
             
         import keras
 
         self.model = keras.saving.load_model(model_path)
-
         
         # Load the scalers
         with open(feature_scaler_path, 'rb') as f:
@@ -40,126 +91,216 @@ class PeriodPredictionService:
         Prepare model input from period start/end dates
         
         Args:
-            period_history: List of dictionaries with 'start' and 'end' dates
+            period_history: CycleHistory, or a list of dictionaries with 'start' and 'end' dates
                             Minimum 4 periods needed (to calculate 3 cycles + current)
         
         Returns:
             last_three_cycles: Array of cycle lengths and period durations
-            last_period_date: Date of most recent period
+            last_period_date: Start datetime of the most recent completed period, as recorded
         """
+        if not isinstance(period_history, CycleHistory):
+            period_history = CycleHistory.from_period_history(period_history)
+        
         # Need at least 4 periods to calculate 3 cycles
-        if len(period_history) < 4:
+        if not (model_input := period_history.model_input()):
             raise ValueError("Need at least 4 periods to make a prediction")
         
-        # Convert string dates to datetime objects if needed
-        for period in period_history:
-            if isinstance(period['start'], str):
-                period['start'] = datetime.fromisoformat(period['start'])
-            if isinstance(period['end'], str):
-                period['end'] = datetime.fromisoformat(period['end'])
+        cycles, _ = model_input
         
-        # Sort history by start date (most recent last)
-        period_history.sort(key=lambda x: x['start'])
+        # The recorded start, like get_model_input and the batch precompute, so every path predicts the same next_period_start
+        return cycles.tolist(), period_history.only_completed().last_start_datetime
+    
+    def predict_batch(self, cycles_batch):
+        """
+        Run the model on many users at once
         
-        # Get most recent periods (last 4)
-        recent_periods = period_history[-4:]
+        Args:
+            cycles_batch: Array of shape (n, 3, 2) with [cycle_length, period_duration] rows
+            
+        Returns:
+            Array of shape (n, 2) with unscaled [cycle_length, period_duration] predictions
+        """
+        input_data = np.asarray(cycles_batch, dtype=np.float64)
+        batch_size = input_data.shape[0]
+        input_flat = input_data.reshape(-1, 2)
         
-        # Calculate cycle lengths and period durations
-        cycles = []
+        # Scale the input
+        input_scaled_flat = self.feature_scaler.transform(input_flat)
+        input_scaled = input_scaled_flat.reshape(batch_size, 3, 2)
         
-        for i in range(len(recent_periods)-1):
-            # Current period
-            current = recent_periods[i]
-            # Next period
-            next_period = recent_periods[i+1]
-            
-            # Calculate period duration (end - start)
-            period_duration = (current['end'] - current['start']).days
-            
-            # Calculate cycle length (next start - this start)
-            cycle_length = (next_period['start'] - current['start']).days
-            
-            cycles.append([cycle_length, period_duration])
+        # Get prediction
+        input_padded = self._pad_batch(input_scaled)
+        prediction_scaled = self.model.predict(input_padded, batch_size=min(len(input_padded), self.max_batch_size), verbose=0)[:batch_size]
+        return self.label_scaler.inverse_transform(prediction_scaled)
+    
+    def _pad_batch(self, input_scaled):
+        """
+        Pad a keras batch up to the next power of two (or multiple of max_batch_size), so
+        JAX only ever compiles the handful of shapes covered by warmup()
+        """
+        batch_size = input_scaled.shape[0]
+        if self.backend == "numpy" or batch_size == 0:
+            return input_scaled
+        
+        if batch_size >= self.max_batch_size:
+            padded_size = -(-batch_size // self.max_batch_size) * self.max_batch_size
+        else:
+            padded_size = 1 << (batch_size - 1).bit_length()
         
-        # Get the last period date
-        last_period_date = recent_periods[-1]['start']
+        if padded_size == batch_size:
+            return input_scaled
         
-        return cycles, last_period_date
+        padding = np.repeat(input_scaled[-1:], padded_size - batch_size, axis=0)
+        return np.concatenate([input_scaled, padding])
+    
+    def warmup_batch_sizes(self):
+        """Every padded batch size predict_batch can hand to the model"""
+        batch_sizes = []
+        batch_size = 1
+        while batch_size < self.max_batch_size:
+            batch_sizes.append(batch_size)
+            batch_size *= 2
+        batch_sizes.append(self.max_batch_size)
+        return batch_sizes
+    
+    def warmup(self):
+        """
+        Run one prediction for every batch size that is served, so tracing and compilation
+        happen at startup instead of in the first requests
+        
+        Returns:
+            Seconds spent
+        """
+        started = perf_counter()
+        
+        sample_cycles = [[28, 5], [28, 5], [28, 5]]
+        for batch_size in self.warmup_batch_sizes():
+            self.predict_batch(np.array([sample_cycles] * batch_size, dtype=np.float64))
+        
+        return perf_counter() - started
+    
+    def build_prediction(self, prediction, last_period_date):
+        """Turn one raw model output row into the prediction details dict"""
+        return build_prediction_details(prediction[0], prediction[1], last_period_date)
     
     def predict_next_period(self, period_history):
         """
         Predict the next period based on user history
         
         Args:
-            period_history: List of dictionaries with 'start' and 'end' dates as datetime objects
+            period_history: CycleHistory, or a list of dictionaries with 'start' and 'end' dates
             
         Returns:
             dict with prediction details
         """
         try:
             # Prepare input from period history
-            
-            
             last_three_cycles, last_period_date = self.prepare_input_from_history(period_history)
-            logger.info(f"Last three cycles: {last_three_cycles}")
-            # Make prediction
-            input_data = np.array([last_three_cycles])
-            input_flat = input_data.reshape(-1, 2)
-            
-            # Scale the input
-            input_scaled_flat = self.feature_scaler.transform(input_flat)
-            input_scaled = input_scaled_flat.reshape(1, 3, 2)
+        except Exception as e:
+            logger.error(f"Error generating prediction: {e}")
+            return None
+        
+        return self.predict_from_cycles(last_three_cycles, last_period_date)
+    
+    def predict_from_cycles(self, last_three_cycles, last_period_date):
+        """
+        Predict the next period from an already prepared model input
+        
+        Args:
+            last_three_cycles: List of 3 [cycle_length, period_duration] pairs, oldest first
+            last_period_date: Start date of the most recent completed period
             
-            # Get prediction
-            prediction_scaled = self.model.predict(input_scaled, verbose=0)
-            prediction = self.label_scaler.inverse_transform(prediction_scaled)[0]
+        Returns:
+            dict with prediction details
+        """
+        try:
+            logger.info(f"Last three cycles: {last_three_cycles}")
             
-            # Sanitize prediction
-            next_cycle_length = max(min(round(prediction[0]), 45), 21)
-            next_period_duration = max(min(round(prediction[1]), 10), 2)
+            # Get prediction, batched together with any concurrent requests
+            prediction = self.batcher.submit(np.array(last_three_cycles, dtype=np.float64))
+            prediction = self.build_prediction(prediction, last_period_date)
             
-            # Calculate next period dates
-            next_period_start = last_period_date + timedelta(days=next_cycle_length)
-            next_period_end = next_period_start + timedelta(days=next_period_duration)
+            logger.info(f"Next period start: {prediction['next_period_start']}, end: {prediction['next_period_end']}")
             
-            logger.info(f"Next period start: {next_period_start}, end: {next_period_end}")
-            
-            # Return prediction details
-            return {
-                'cycle_length': next_cycle_length,
-                'period_duration': next_period_duration,
-                'next_period_start': next_period_start,
-                'next_period_end': next_period_end,
-                'days_until_next_period': (next_period_start - timezone.now()).days
-            }
+            return prediction
             
         except Exception as e:
             logger.error(f"Error generating prediction: {e}")
             return None
         
         
-def get_next_period_start_date(user_id_hash):
-    current_datetime = timezone.now()
+def build_cycles_batch(start_days, end_days):
+    """
+    Vectorized version of prepare_input_from_history for many users at once
+    
+    Args:
+        start_days: Array of shape (n, 4) with the epoch days of each user's last 4 period starts, oldest first
+        end_days: Array of shape (n, 4) with the matching period end days
+        
+    Returns:
+        Array of shape (n, 3, 2) with [cycle_length, period_duration] rows
+    """
+    starts = np.asarray(start_days, dtype=np.int32)
+    ends = np.asarray(end_days, dtype=np.int32)
     
-    cycle_prediction = CyclePreditction.objects.filter(user_id_hash=user_id_hash).first()
+    cycle_lengths = np.diff(starts, axis=1)
+    period_durations = ends[:, :-1] - starts[:, :-1]
+    
+    return np.stack([cycle_lengths, period_durations], axis=-1).astype(np.float64)
+
+
+def is_prediction_eligible(features):
+    """The model needs 4 completed periods, checked on the stored count before the model is touched"""
+    return features.period_duration_count >= 4
+
+
+def estimate_next_period(features):
+    """
+    Arithmetic-mean estimate for users without enough history for the model
     
-    # If the last preditction datetime is more than 24 hours then only we need to generate new prediction
-    if cycle_prediction and (current_datetime - cycle_prediction.update_datetime).days < 1:
-        return cycle_prediction.next_period_start
+    Averages whatever cycles and periods were recorded, falling back to the default phase
+    durations, and counts from the most recent period start.
+    """
+    if features.last_start_datetime is None:
+        return None
     
+    if features.cycle_length_count:
+        cycle_length = features.cycle_length_sum / features.cycle_length_count
+    else:
+        cycle_length = DEFAULT_CYCLE_LENGTH
     
-    period_records = PeriodRecord.objects.filter(user_id_hash=user_id_hash, current_status=PeriodRecord.CurrentStatus.COMPLETED.value)
-        
-    period_history = []
-    for period_record in period_records:
-        period_history.append({
-            'start': period_record.start_datetime,
-            'end': period_record.end_datetime
-        })
+    if features.period_duration_count:
+        period_duration = features.period_duration_sum / features.period_duration_count
+    else:
+        period_duration = PhaseDuration.MENSTRUAL.value
     
-        
-    prediction_service = PeriodPredictionService()
-    prediction = prediction_service.predict_next_period(period_history)
+    return build_prediction_details(cycle_length, period_duration, features.last_start_datetime)
+
+
+def predict_for_user(user_id_hash, features=None):
+    """Prediction details from the user's stored cycle features, or None if nothing was recorded yet"""
+    features = features or get_cycle_features(user_id_hash)
+    
+    # New users get the cheap estimate without loading the model
+    if not is_prediction_eligible(features):
+        logger.info(f"Not enough completed periods to predict for {user_id_hash}, using the average estimate")
+        return estimate_next_period(features)
+    
+    last_three_cycles, last_period_date = get_model_input(features)
+    
+    prediction_service = get_prediction_service()
+    return prediction_service.predict_from_cycles(last_three_cycles, last_period_date)
+
+
+def get_history_version(user_id_hash):
+    """Current version of the user's completed period history, 0 if nothing was recorded yet"""
+    history_version = CurrentPeriod.objects.filter(user_id_hash=user_id_hash).values_list('history_version', flat=True).first()
+    return history_version or 0
+
+
+def generate_cycle_prediction(user_id_hash, history_version, features=None):
+    """Run the model on the user's completed periods and store the result tagged with `history_version`"""
+    prediction = predict_for_user(user_id_hash, features=features)
     
     if prediction:
         logger.info(f"Prediction data generated successfully:\n{prediction}")   
@@ -171,8 +312,130 @@ def get_next_period_start_date(user_id_hash):
                 'period_duration': prediction['period_duration'],
                 'next_period_start': prediction['next_period_start'],
                 'next_period_end': prediction['next_period_end'],
-                'days_until_next_period': prediction['days_until_next_period']
+                'days_until_next_period': prediction['days_until_next_period'],
+                'history_version': history_version
             }
         )
+        invalidate_user_cache(user_id_hash)
+    
+    return prediction
+
+
+def acquire_refresh_lock(user_id_hash, history_version):
+    """
+    Take the user's refresh lock for `history_version` with one conditional upsert
+    
+    Succeeds if there is no lock yet, it was released or expired, or it is held for another
+    version. When the lock for this version is held the filter misses, the upsert collides with
+    the existing document on the unique primary key index and the lock is not taken.
+    """
+    now = timezone.now()
+    
+    connection.ensure_connection()
+    try:
+        connection.connection[PredictionRefreshLock._meta.db_table].update_one(
+            {
+                'user_id_hash': user_id_hash,
+                '$or': [
+                    {'history_version': {'$ne': history_version}},
+                    {'locked_until': None},
+                    {'locked_until': {'$lte': now}},
+                ],
+            },
+            {'$set': {
+                'history_version': history_version,
+                'locked_until': now + timedelta(seconds=settings.PREDICTION_REFRESH_LOCK_SECONDS),
+            }},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        return False
+    
+    return True
+
+
+def release_refresh_lock(user_id_hash, history_version):
+    """Release the lock if it is still held for `history_version`, a lock taken for a newer version is left alone"""
+    connection.ensure_connection()
+    connection.connection[PredictionRefreshLock._meta.db_table].update_one(
+        {'user_id_hash': user_id_hash, 'history_version': history_version},
+        {'$set': {'locked_until': None}},
+    )
+
+
+def queue_prediction_refresh(user_id_hash, history_version, countdown=None):
+    """
+    Schedule a background recompute of the user's prediction
+    
+    Single-flight per history version across every process: while a refresh for this version is
+    queued, further calls are no-ops. After a write the task runs with
+    PREDICTION_REFRESH_DEBOUNCE_SECONDS countdown and skips itself if the version moved on in the
+    meantime, so a burst of edits ends up in a single recompute. The task releases the lock
+    however it exits.
+    """
+    from predictions.tasks import refresh_cycle_prediction
+    
+    if not acquire_refresh_lock(user_id_hash, history_version):
+        return False
+    
+    try:
+        refresh_cycle_prediction.apply_async(
+            args=[user_id_hash, history_version],
+            countdown=settings.PREDICTION_REFRESH_DEBOUNCE_SECONDS if countdown is None else countdown
+        )
+    except Exception as e:
+        # The next read retries, a broker outage must not fail the request
+        logger.error(f"Error queueing prediction refresh for {user_id_hash}: {e}")
+        release_refresh_lock(user_id_hash, history_version)
+        return False
+    
+    return True
+
+
+def serialize_cycle_prediction(cycle_prediction):
+    """Prediction details dict of a stored CyclePreditction, with the day count relative to now"""
+    return {
+        'cycle_length': cycle_prediction.cycle_length,
+        'period_duration': cycle_prediction.period_duration,
+        'next_period_start': cycle_prediction.next_period_start,
+        'next_period_end': cycle_prediction.next_period_end,
+        'days_until_next_period': (cycle_prediction.next_period_start - timezone.now()).days
+    }
+
+
+def get_cycle_prediction(user_id_hash, fresh=False, context=None):
+    """
+    Stale-while-revalidate read of the user's prediction
+    
+    Returns the stored prediction immediately. If it was made from an older history version a
+    single background refresh is queued and the stale prediction is still returned. Inference
+    only runs in the request when nothing is stored yet or `fresh` is set.
+    
+    Returns:
+        (prediction, age_seconds, stale), prediction is None if there is not enough history
+    """
+    if context:
+        history_version = context.history_version
+        cycle_prediction = context.cycle_prediction
+    else:
+        history_version = get_history_version(user_id_hash)
+        cycle_prediction = CyclePreditction.objects.filter(user_id_hash=user_id_hash).first()
+    
+    if cycle_prediction and not fresh:
+        age_seconds = int((timezone.now() - cycle_prediction.update_datetime).total_seconds())
+        stale = cycle_prediction.history_version != history_version
+        
+        if stale:
+            queue_prediction_refresh(user_id_hash, history_version, countdown=0)
+        
+        return serialize_cycle_prediction(cycle_prediction), age_seconds, stale
+    
+    prediction = generate_cycle_prediction(user_id_hash, history_version, features=context.features if context else None)
+    
+    return prediction, 0, False
+
+
+def get_next_period_start_date(user_id_hash, fresh=False, context=None):
+    prediction, _, _ = get_cycle_prediction(user_id_hash, fresh=fresh, context=context)
     
-    return prediction['next_period_start'] if prediction else None
\ No newline at end of file
+    return prediction['next_period_start'] if prediction else None
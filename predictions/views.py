@@ -1,9 +1,8 @@
 from rest_framework.views import APIView
 from logging import getLogger
 
-from cycles.models import PeriodRecord
 from utils.helpers import forge
-from predictions.utils import PeriodPredictionService
+from predictions.utils import get_cycle_prediction
 
 logger = getLogger(__name__)
 
@@ -14,25 +13,17 @@ class PredictionView(APIView):
     def get(self, request):
         
         user_id_hash = request.user_obj.user_id_hash
+        fresh = request.query_params.get('fresh', '0') == '1'
         
-        period_records = PeriodRecord.objects.filter(user_id_hash=user_id_hash, current_status=PeriodRecord.CurrentStatus.COMPLETED.value)
+        prediction, age_seconds, stale = get_cycle_prediction(user_id_hash, fresh=fresh)
         
-        period_history = []
-        for period_record in period_records:
-            period_history.append({
-                'start': period_record.start_datetime,
-                'end': period_record.end_datetime
-            })
-        
-            
-        prediction_service = PeriodPredictionService()
-        prediction = prediction_service.predict_next_period(period_history)
-        
-        logger.info(f"Prediction data generated successfully:\n{prediction}")
+        logger.info(f"Prediction data fetched successfully:\n{prediction}")
         
         return {
-            "message": "Prediction data generated successfully",
-            "prediction_data": prediction
+            "message": "Prediction data fetched successfully",
+            "prediction_data": prediction,
+            "age_seconds": age_seconds,
+            "stale": stale
         }
 
 
@@ -9,7 +9,7 @@ if [ "$1" = "true" ]; then
     python manage.py migrate
 
     echo "Starting Gunicorn server..."
-    gunicorn -w 4 -b 0.0.0.0:8000 -k uvicorn.workers.UvicornWorker period_tracking_BE.asgi:application
+    gunicorn -c gunicorn.conf.py -w 4 -b 0.0.0.0:8000 -k uvicorn.workers.UvicornWorker period_tracking_BE.asgi:application
 else
     echo "Running makemigrations..."
     python manage.py makemigrations
@@ -0,0 +1,115 @@
+import csv
+import zlib
+from itertools import chain
+from tempfile import SpooledTemporaryFile
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from cycles.models import PeriodRecord, SymptomsRecord
+from predictions.models import CyclePreditction
+
+# Rows fetched per server-side cursor batch, and rows encoded per streamed chunk
+EXPORT_BATCH_SIZE = 500
+# Encoded bytes an export keeps in memory before it spills to a temporary file
+EXPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
+PERIOD_RECORD = 'period_record'
+SYMPTOM = 'symptom'
+PREDICTION = 'prediction'
+
+PERIOD_RECORD_FIELDS = ['period_record_id', 'current_status', 'start_datetime', 'end_datetime']
+SYMPTOM_FIELDS = ['symptom_id', 'symptom', 'comments', 'symptom_occurence', 'period_record_id', 'created_datetime']
+PREDICTION_FIELDS = [
+    'cycle_length', 'period_duration', 'next_period_start', 'next_period_end', 'days_until_next_period', 'update_datetime'
+]
+
+# One CSV holds every record type, columns a type does not have are left empty
+CSV_COLUMNS = ['record_type'] + list(dict.fromkeys(PERIOD_RECORD_FIELDS + SYMPTOM_FIELDS + PREDICTION_FIELDS))
+
+
+def _records(record_type, queryset, fields, batch_size):
+    """Rows of one collection as dicts, read through a server-side cursor `batch_size` documents at a time"""
+    for values in queryset.values_list(*fields).iterator(chunk_size=batch_size):
+        yield {'record_type': record_type, **dict(zip(fields, values))}
+
+
+def export_records(user_id_hash, batch_size=EXPORT_BATCH_SIZE):
+    """Lazily yields the user's period records, symptoms and prediction, oldest first within each type"""
+    return chain(
+        _records(
+            PERIOD_RECORD,
+            PeriodRecord.objects.filter(user_id_hash=user_id_hash).order_by('start_datetime'),
+            PERIOD_RECORD_FIELDS,
+            batch_size
+        ),
+        _records(
+            SYMPTOM,
+            SymptomsRecord.objects.filter(user_id_hash=user_id_hash).order_by('created_datetime'),
+            SYMPTOM_FIELDS,
+            batch_size
+        ),
+        _records(PREDICTION, CyclePreditction.objects.filter(user_id_hash=user_id_hash), PREDICTION_FIELDS, batch_size),
+    )
+
+
+def _chunked(lines, batch_size):
+    """Joins every `batch_size` lines into one chunk, so the response is not written a line at a time"""
+    chunk = []
+    for line in lines:
+        chunk.append(line)
+        if len(chunk) >= batch_size:
+            yield ''.join(chunk)
+            chunk = []
+
+    if chunk:
+        yield ''.join(chunk)
+
+
+def encode_ndjson(records, batch_size=EXPORT_BATCH_SIZE):
+    encoder = DjangoJSONEncoder()
+    return _chunked((encoder.encode(record) + '\n' for record in records), batch_size)
+
+
+class _LineBuffer:
+    """File-like object for csv.writer that hands back the written line instead of storing it"""
+
+    def write(self, value):
+        return value
+
+
+def encode_csv(records, batch_size=EXPORT_BATCH_SIZE):
+    writer = csv.DictWriter(_LineBuffer(), fieldnames=CSV_COLUMNS, restval='')
+    lines = chain([writer.writeheader()], (writer.writerow(record) for record in records))
+    return _chunked(lines, batch_size)
+
+
+def gzip_chunks(chunks):
+    """Compresses the text chunks on the fly into a single gzip stream"""
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        if data := compressor.compress(chunk.encode()):
+            yield data
+
+    yield compressor.flush()
+
+
+def spool(chunks, max_size=EXPORT_SPOOL_BYTES):
+    """
+    Writes the chunks to a temporary file, held in memory up to `max_size` bytes, rewound for reading
+
+    The records have to be read from the database in the request's thread: under ASGI, Django
+    4.1 iterates a streaming response on the event loop, where the ORM is not allowed.
+    """
+    file = SpooledTemporaryFile(max_size=max_size)
+    for chunk in chunks:
+        file.write(chunk.encode() if isinstance(chunk, str) else chunk)
+
+    file.seek(0)
+    return file
+
+
+EXPORT_FORMATS = {
+    # output: (encoder, content type, file extension)
+    'ndjson': (encode_ndjson, 'application/x-ndjson', 'ndjson'),
+    'csv': (encode_csv, 'text/csv', 'csv'),
+}
@@ -1,4 +1,5 @@
 from uuid import uuid4
+from typing import ClassVar
 from djongo import models
 from django_enumfield import enum
 
@@ -7,16 +8,28 @@ class User(models.Model):
     class Meta:
         db_table = 'user'
     
+    # Declarative MongoDB indexes, created and reconciled by `manage.py sync_indexes`
+    MONGO_INDEXES: ClassVar[list] = [
+        {'name': 'email', 'keys': [('email', 1)], 'unique': True},
+        {'name': 'user_id_hash', 'keys': [('user_id_hash', 1)]},
+    ]
+    
     user_id = models.UUIDField(primary_key=True, default=uuid4, editable=False)
     user_id_hash = models.CharField(max_length=200)
     email = models.EmailField(max_length=100, unique=True)
     password = models.CharField(max_length=200)
+    # Grants the operational endpoints, e.g. the dashboard cache stats
+    is_staff = models.BooleanField(default=False)
     created_datetime = models.DateTimeField(auto_now_add=True)
     updated_datetime = models.DateTimeField(auto_now=True)
     
 class UserDetails(models.Model):
     class Meta:
         db_table = 'user_details'
+    
+    MONGO_INDEXES: ClassVar[list] = [
+        {'name': 'user_id_hash', 'keys': [('user_id_hash', 1)], 'unique': True},
+    ]
         
     user_id_hash = models.CharField(max_length=200, primary_key=True, editable=False)
     first_name = models.CharField(max_length=100)
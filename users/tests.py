@@ -0,0 +1,53 @@
+import asyncio
+import gzip
+import json
+from unittest import mock
+
+from django.core.handlers.asgi import ASGIHandler
+from django.test import RequestFactory, SimpleTestCase
+from django.utils.asyncio import async_unsafe
+
+from users.export import PERIOD_RECORD
+from users.views import UserExportView
+
+
+@async_unsafe
+def fetch_period_records():
+    """Stands in for an ORM query, raises SynchronousOnlyOperation when called on the event loop"""
+    return [{'record_type': PERIOD_RECORD, 'period_record_id': str(index)} for index in range(3)]
+
+
+def export_records(user_id_hash):
+    yield from fetch_period_records()
+
+
+class UserExportASGITests(SimpleTestCase):
+
+    def export(self, query):
+        request = RequestFactory().get('/api/v1/user/export/', query)
+        request.user_obj = mock.Mock(user_id_hash='user')
+
+        with mock.patch('users.views.export_records', export_records):
+            response = UserExportView.as_view()(request)
+
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        asyncio.run(ASGIHandler().send_response(response, send))
+
+        self.assertEqual(messages[0]['status'], 200)
+        return messages[0], b''.join(message.get('body', b'') for message in messages[1:])
+
+    def test_ndjson_through_asgi_handler(self):
+        start, body = self.export({})
+
+        self.assertIn((b'Content-Type', b'application/x-ndjson'), start['headers'])
+        self.assertEqual([json.loads(line)['period_record_id'] for line in body.decode().splitlines()], ['0', '1', '2'])
+
+    def test_gzip_through_asgi_handler(self):
+        start, body = self.export({'output': 'csv', 'gzip': '1'})
+
+        self.assertIn((b'Content-Type', b'application/gzip'), start['headers'])
+        self.assertEqual(len(gzip.decompress(body).decode().splitlines()), 4)
@@ -1,7 +1,8 @@
 from django.urls import path
 
-from users.views import UserDetailsView
+from users.views import UserDetailsView, UserExportView
 
 urlpatterns = [
     path('details/', UserDetailsView.as_view(), name='user_details'),
+    path('export/', UserExportView.as_view(), name='user_export'),
 ]
\ No newline at end of file
@@ -1,7 +1,12 @@
 from django.forms import model_to_dict
+from django.http import FileResponse
+from django.utils import timezone
 from rest_framework.views import APIView
+from cycles.cache import invalidate_user_cache
+from cycles.features import rebuild_cycle_features
 from cycles.models import CurrentPeriod, PeriodRecord
 
+from users.export import EXPORT_FORMATS, export_records, gzip_chunks, spool
 from users.models import  User, UserDetails
 from utils.helpers import convert_to_utc, forge, get_serialized_data
 from utils.exceptions import BadRequest, ResourceNotFound
@@ -85,6 +90,9 @@ class UserDetailsView(APIView):
             last_period_record_id=None if ongoing_period else period_record.period_record_id
         )
         
+        rebuild_cycle_features(user_id_hash)
+        invalidate_user_cache(user_id_hash)
+        
         
         
         return {'message': 'User details added successfully'}
@@ -121,5 +129,28 @@ class UserDetailsView(APIView):
         
         return {'message': 'User details updated successfully'}
 
-         
-       
+
+class UserExportView(APIView):
+    
+    def get(self, request):
+        user_id_hash = request.user_obj.user_id_hash
+        
+        # Not `format`, DRF reserves that query parameter for renderer selection
+        output = request.query_params.get('output', 'ndjson')
+        compress = request.query_params.get('gzip', '0').lower() in ('1', 'true')
+        
+        if output not in EXPORT_FORMATS:
+            raise BadRequest(f'output should be one of {", ".join(EXPORT_FORMATS)}')
+        
+        encode, content_type, extension = EXPORT_FORMATS[output]
+        
+        # Records are read, encoded and compressed batch by batch into a spooled file here, in the view's
+        # thread, and the response only streams that file back
+        chunks = encode(export_records(user_id_hash))
+        filename = f'cycle-sync-export-{timezone.localdate().isoformat()}.{extension}'
+        if compress:
+            chunks = gzip_chunks(chunks)
+            content_type = 'application/gzip'
+            filename += '.gz'
+        
+        return FileResponse(spool(chunks), as_attachment=True, filename=filename, content_type=content_type)
@@ -1,12 +1,16 @@
 # from datetime import datetime, timedelta
 import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
 from traceback import print_exc
 from typing import Any, Dict, Optional
 from django.conf import settings
 from django.http import JsonResponse
-from django.db import models
+from django.db import connection, models
+from django.db.models import Q
 from django.utils import timezone
 import pytz
+from pymongo import UpdateOne
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework import serializers
@@ -166,4 +170,70 @@ def convert_to_utc(date_time):
         date_time = timezone.make_aware(date_time, timezone.get_current_timezone())
     
     # Convert to UTC if it’s not already UTC
-    return date_time.astimezone(timezone.utc)
\ No newline at end of file
+    return date_time.astimezone(timezone.utc)
+
+
+'''
+Keyset (cursor) pagination, newest first
+Each page continues strictly after the (sort value, id) of the last row of the previous page, so
+deep pages cost the same as the first one instead of skipping every earlier document
+'''
+def encode_cursor(sort_value, row_id):
+    payload = json.dumps([sort_value.isoformat(), str(row_id)])
+    return urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        sort_value, row_id = json.loads(urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return datetime.fromisoformat(sort_value), row_id
+    except (ValueError, TypeError):
+        raise BadRequest('Invalid cursor provided')
+
+
+def paginate_by_cursor(queryset, sort_field, id_field, cursor, rows_per_page):
+    """
+    Returns:
+        (rows as dicts, next_cursor), next_cursor is None on the last page
+    """
+    if cursor:
+        sort_value, row_id = decode_cursor(cursor)
+        queryset = queryset.filter(
+            Q(**{f'{sort_field}__lt': sort_value}) | Q(**{sort_field: sort_value, f'{id_field}__lt': row_id})
+        )
+    
+    # One extra row tells whether there is a next page
+    rows = list(queryset.order_by(f'-{sort_field}', f'-{id_field}')[:rows_per_page + 1].values())
+    
+    next_cursor = None
+    if len(rows) > rows_per_page:
+        rows = rows[:rows_per_page]
+        next_cursor = encode_cursor(rows[-1][sort_field], rows[-1][id_field])
+    
+    return rows, next_cursor
+
+
+def bulk_upsert(model, instances):
+    """
+    Upsert model instances by primary key with one pymongo bulk_write
+
+    djongo cannot translate the CASE WHEN SQL of QuerySet.bulk_update, so batch writes go to
+    the collection directly. Values are prepared by the fields like a save() would (auto_now
+    included) and stored the way djongo stores them.
+    """
+    if not instances:
+        return
+
+    pk = model._meta.pk
+    fields = [field for field in model._meta.concrete_fields if not field.primary_key]
+    operations = [
+        UpdateOne(
+            {pk.column: pk.get_db_prep_save(getattr(instance, pk.attname), connection)},
+            {'$set': {field.column: field.get_db_prep_save(field.pre_save(instance, False), connection) for field in fields}},
+            upsert=True,
+        )
+        for instance in instances
+    ]
+
+    connection.ensure_connection()
+    connection.connection[model._meta.db_table].bulk_write(operations, ordered=False)
@@ -0,0 +1,37 @@
+import os
+import resource
+
+
+def get_memory_usage(pid='self'):
+    """
+    Memory usage of a process in bytes, read from /proc on Linux.
+    
+    `rss` counts every resident page, `pss` splits shared pages between the processes mapping
+    them and `shared` is the part of rss also mapped by other processes (e.g. pages inherited
+    from the gunicorn master). Only `rss` is available on other platforms.
+    """
+    usage = {'rss': None, 'pss': None, 'shared': None}
+    
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            fields = {}
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == 'kB':
+                    fields[parts[0].rstrip(':')] = int(parts[1]) * 1024
+        
+        usage['rss'] = fields.get('Rss')
+        usage['pss'] = fields.get('Pss')
+        usage['shared'] = fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)
+    except OSError:
+        # Peak RSS as a fallback, kilobytes on Linux and bytes on macOS
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        usage['rss'] = max_rss if os.uname().sysname == 'Darwin' else max_rss * 1024
+    
+    return usage
+
+
+def format_memory_usage(usage):
+    return ', '.join(
+        f"{key}={value / (1024 * 1024):.1f}MB" for key, value in usage.items() if value is not None
+    )